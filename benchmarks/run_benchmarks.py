@@ -0,0 +1,200 @@
+# Benchmarks de extremo a extremo: genera maestros y libros de partidas sintéticos y mide la
+# lectura del Excel, la división, el filtrado y la fusión. Los resultados se guardan en JSON
+# para comparar ejecuciones de distintos commits:
+#
+#   python benchmarks/run_benchmarks.py --escenarios pequeño mediano
+#   python benchmarks/run_benchmarks.py --comparar benchmarks/resultados/anterior.json
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+import excel_factory  # noqa: E402
+from benchmarks.sinteticos import generar_base, generar_maestro, generar_partidas  # noqa: E402
+from progress import FinEtapa, Progreso  # noqa: E402
+from test2 import split_doc_by_heading3  # noqa: E402
+from test3 import CACHE_DOCUMENTOS, MOTORES, Test3Factory  # noqa: E402
+from word_factory import WordFactory  # noqa: E402
+
+RESULTADOS_DIR = os.path.join(RAIZ, "benchmarks", "resultados")
+
+# Tamaños predefinidos: estructura del maestro y filas del libro de partidas.
+# Cada fila con código es una sección que se concatena en la fusión, así que las filas marcan su duración.
+ESCENARIOS = {
+    "pequeño": {"n_h1": 2, "n_h2": 3, "n_h3": 5, "parrafos": 3, "tablas": 1, "imagen_cada": 3, "listas": 3,
+                "filas": 60},
+    "mediano": {"n_h1": 4, "n_h2": 5, "n_h3": 15, "parrafos": 4, "tablas": 1, "imagen_cada": 4, "listas": 3,
+                "filas": 500},
+    "grande": {"n_h1": 8, "n_h2": 6, "n_h3": 25, "parrafos": 5, "tablas": 2, "imagen_cada": 5, "listas": 4,
+               "filas": 2000},
+}
+
+
+def commit_actual():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Cronometro:
+    """
+    Mide el tiempo total de cada etapa y recoge los tiempos por fase de los eventos FinEtapa.
+    """
+
+    def __init__(self):
+        self.etapas = {}
+        self.progreso = Progreso(self._registrar)
+        self._fases = {}
+
+    def _registrar(self, evento):
+        if isinstance(evento, FinEtapa):
+            self._fases.update(evento.tiempos)
+
+    @contextlib.contextmanager
+    def etapa(self, nombre):
+        self._fases = {}
+        t0 = time.perf_counter()
+        yield
+        resultado = self.etapas.setdefault(nombre, {"segundos": [], "fases": {}})
+        resultado["segundos"].append(time.perf_counter() - t0)
+        for fase, segundos in self._fases.items():
+            resultado["fases"].setdefault(fase, []).append(segundos)
+
+
+def ejecutar_escenario(nombre, parametros, repeticiones, n_workers, verbose=False):
+    """
+    Genera los ficheros del escenario en una carpeta temporal y mide cada etapa repeticiones veces.
+    """
+    parametros = dict(parametros)
+    filas = parametros.pop("filas")
+    trabajo = tempfile.mkdtemp(prefix=f"bench_{nombre}_")
+    try:
+        maestro = os.path.join(trabajo, "maestro.docx")
+        base = os.path.join(trabajo, "original.docx")
+        partidas = os.path.join(trabajo, "partidas.xlsx")
+        t0 = time.perf_counter()
+        codigos = generar_maestro(maestro, **parametros)
+        generar_base(base)
+        generar_partidas(partidas, codigos, n_filas=filas)
+        print(f"[{nombre}] {len(codigos)} secciones, {filas} filas (generado en {time.perf_counter() - t0:.1f}s)")
+
+        cronometro = Cronometro()
+        salida = None if verbose else io.StringIO()
+        for repeticion in range(repeticiones):
+            excel_factory._PARTIDAS_CACHE.clear()
+            salida_dir = os.path.join(trabajo, f"division_{repeticion}")
+            with contextlib.redirect_stdout(salida) if salida else contextlib.nullcontext():
+                with cronometro.etapa("excel"):
+                    factory = excel_factory.ExcelFactory(partidas)
+                    lista = factory.excel_to_list(progreso=cronometro.progreso)
+                    registros = factory.cargar_partidas().to_records()
+                with cronometro.etapa("division"):
+                    sections_dir = split_doc_by_heading3(
+                        maestro, salida_dir, n_workers=n_workers, progreso=cronometro.progreso
+                    )
+                with cronometro.etapa("filtrado"):
+                    json_path = os.path.join(trabajo, "partidas.json")
+                    with open(json_path, "w", encoding="utf-8") as f:
+                        json.dump(registros, f, ensure_ascii=False)
+                    wf = WordFactory(json_path, maestro)
+                    wf.filter_sections(wf.codigos_adicionales, maestro, os.path.join(trabajo, "filtrado.docx"))
+                for motor in MOTORES:
+                    # cada motor parte de la caché de secciones vacía, como una ejecución nueva
+                    CACHE_DOCUMENTOS.clear()
+                    with cronometro.etapa(f"fusion_{motor}"):
+                        Test3Factory(base, sections_dir, lista, os.path.join(trabajo, f"anexo_{motor}.docx")) \
+                            .merge_sections(motor, progreso=cronometro.progreso)
+            shutil.rmtree(salida_dir, ignore_errors=True)
+            if salida:
+                salida.seek(0)
+                salida.truncate()
+
+        etapas = {}
+        for etapa, datos in cronometro.etapas.items():
+            etapas[etapa] = {
+                "segundos": datos["segundos"],
+                "mediana": statistics.median(datos["segundos"]),
+                "minimo": min(datos["segundos"]),
+                "fases": {fase: statistics.median(valores) for fase, valores in datos["fases"].items()},
+            }
+            print(f"[{nombre}] {etapa:<16} mediana {etapas[etapa]['mediana']:.3f}s  mínimo {etapas[etapa]['minimo']:.3f}s")
+        return {
+            "parametros": dict(parametros, filas=filas),
+            "secciones": len(codigos),
+            "repeticiones": repeticiones,
+            "n_workers": n_workers,
+            "etapas": etapas,
+        }
+    finally:
+        shutil.rmtree(trabajo, ignore_errors=True)
+
+
+def comparar(actual, anterior):
+    """
+    Muestra, por escenario y etapa, la mediana actual frente a la de un resultado anterior.
+    """
+    print(f"\nComparación con {anterior.get('commit') or '?'} ({anterior.get('fecha', '?')}):")
+    for nombre, escenario in actual["escenarios"].items():
+        previo = anterior.get("escenarios", {}).get(nombre)
+        if not previo:
+            continue
+        for etapa, datos in escenario["etapas"].items():
+            antes = previo["etapas"].get(etapa)
+            if not antes:
+                continue
+            ratio = datos["mediana"] / antes["mediana"] if antes["mediana"] else float("inf")
+            print(f"  {nombre:<8} {etapa:<16} {antes['mediana']:8.3f}s -> {datos['mediana']:8.3f}s  (x{ratio:.2f})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks de división, filtrado y fusión con datos sintéticos.")
+    parser.add_argument("--escenarios", nargs="+", default=["pequeño"], choices=sorted(ESCENARIOS))
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=1, help="Procesos de la división (1 = secuencial)")
+    parser.add_argument("--salida", help="Fichero JSON de resultados (por defecto en benchmarks/resultados)")
+    parser.add_argument("--comparar", metavar="JSON", help="Resultado anterior con el que comparar")
+    parser.add_argument("--verbose", action="store_true", help="No ocultar los mensajes de cada etapa")
+    args = parser.parse_args()
+
+    commit = commit_actual()
+    resultado = {
+        "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "escenarios": {},
+    }
+    for nombre in args.escenarios:
+        resultado["escenarios"][nombre] = ejecutar_escenario(
+            nombre, ESCENARIOS[nombre], args.repeticiones, args.workers, args.verbose
+        )
+
+    salida = args.salida
+    if not salida:
+        os.makedirs(RESULTADOS_DIR, exist_ok=True)
+        salida = os.path.join(RESULTADOS_DIR, f"{time.strftime('%Y%m%d_%H%M%S')}_{commit or 'sin_commit'}.json")
+    with open(salida, "w", encoding="utf-8") as f:
+        json.dump(resultado, f, ensure_ascii=False, indent=2)
+    print(f"Resultados guardados en: {salida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            comparar(resultado, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
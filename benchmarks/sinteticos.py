@@ -0,0 +1,139 @@
+# Generadores de documentos maestros y libros de partidas sintéticos para los benchmarks.
+# Solo dependen de python-docx y openpyxl; con la misma semilla producen siempre el mismo contenido.
+import io
+import random
+import struct
+import zlib
+from docx import Document
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls
+from openpyxl import Workbook
+
+LETRAS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+
+def codigo_seccion(k):
+    """
+    Código de la sección k: 3 letras + 3 números, como los identificadores reales (p. ej. ABC123).
+    """
+    prefijo, numero = divmod(k, 1000)
+    letras = ""
+    for _ in range(3):
+        prefijo, resto = divmod(prefijo, len(LETRAS))
+        letras = LETRAS[resto] + letras
+    return f"{letras}{numero:03d}"
+
+
+def png(ancho=8, alto=8, color=(200, 30, 30)):
+    """
+    PNG RGB de un solo color, sin depender de Pillow.
+    """
+    filas = b"".join(b"\x00" + bytes(color) * ancho for _ in range(alto))
+
+    def chunk(tipo, datos):
+        return struct.pack(">I", len(datos)) + tipo + datos + struct.pack(">I", zlib.crc32(tipo + datos) & 0xFFFFFFFF)
+
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", ancho, alto, 8, 2, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(filas))
+        + chunk(b"IEND", b"")
+    )
+
+
+def control_cambios(p, k):
+    """
+    Añade al párrafo p un texto insertado y otro eliminado con control de cambios (w:ins y w:del).
+    """
+    autor = 'w:author="Revisor" w:date="2024-01-01T00:00:00Z"'
+    p._p.append(parse_xml(
+        f'<w:ins {nsdecls("w")} w:id="{2 * k + 1}" {autor}><w:r><w:t xml:space="preserve"> añadido</w:t></w:r></w:ins>'
+    ))
+    p._p.append(parse_xml(
+        f'<w:del {nsdecls("w")} w:id="{2 * k + 2}" {autor}><w:r><w:delText> eliminado</w:delText></w:r></w:del>'
+    ))
+
+
+def generar_maestro(
+    path, n_h1=3, n_h2=3, n_h3=5, parrafos=3, tablas=1, imagen_cada=3, listas=0, cambios_cada=0, seed=1
+):
+    """
+    Genera un documento maestro con n_h1 Heading 1, n_h2 Heading 2 por cada uno y n_h3
+    secciones Heading 3 por cada Heading 2. Cada sección lleva parrafos párrafos de texto,
+    tablas tablas de 3x3, una lista numerada y otra de viñetas de listas elementos cada una
+    (estilos List Number y List Bullet, con un segundo nivel) y, una de cada imagen_cada
+    secciones, una imagen; una de cada cambios_cada, un párrafo con control de cambios
+    (0 = ninguna). Devuelve la lista de códigos de las secciones, en orden.
+    """
+    rnd = random.Random(seed)
+    doc = Document()
+    codigos = []
+    for i in range(n_h1):
+        doc.add_heading(f"CAPÍTULO {i + 1}", 1)
+        for j in range(n_h2):
+            doc.add_heading(f"Subcapítulo {i + 1}.{j + 1}", 2)
+            for _ in range(n_h3):
+                k = len(codigos)
+                codigo = codigo_seccion(k)
+                codigos.append(codigo)
+                doc.add_heading(f"{codigo} Unidad de obra {k}", 3)
+                for p in range(parrafos):
+                    palabras = " ".join(rnd.choice(("hormigón", "acero", "tubería", "arqueta", "relleno", "zanja"))
+                                        for _ in range(30))
+                    doc.add_paragraph(f"{p + 1}. {palabras}.")
+                for estilo in ("List Number", "List Bullet") if listas else ():
+                    for n in range(listas):
+                        nivel = f"{estilo} 2" if n == listas - 1 and listas > 1 else estilo
+                        doc.add_paragraph(f"Punto {n + 1} de {codigo}", style=nivel)
+                if cambios_cada and k % cambios_cada == 0:
+                    control_cambios(doc.add_paragraph(f"Revisión de {codigo}:"), k)
+                for _ in range(tablas):
+                    tabla = doc.add_table(rows=3, cols=3)
+                    for fila in tabla.rows:
+                        for celda in fila.cells:
+                            celda.text = f"{rnd.random() * 100:.2f}"
+                if imagen_cada and k % imagen_cada == 0:
+                    doc.add_picture(io.BytesIO(png(color=(k % 256, (k * 7) % 256, 120))))
+    doc.save(path)
+    return codigos
+
+
+def generar_base(path):
+    """
+    Genera el documento original sobre el que se concatenan las secciones.
+    """
+    doc = Document()
+    doc.add_heading("ANEXO DE UNIDADES DE OBRA", 1)
+    doc.add_paragraph("Documento generado para benchmarks.")
+    doc.save(path)
+
+
+def generar_partidas(path, codigos, n_filas=200, faltantes=0.05, cabecera=3, seed=1):
+    """
+    Genera un libro de partidas con n_filas filas cuyas columnas incluyen CÓDIGO, UD y RESUMEN,
+    con cabecera filas de título antes del encabezado (como los presupuestos reales).
+    Los códigos se toman de codigos con un sufijo; una fracción faltantes usa códigos
+    que no existen en el maestro, y cada 20 filas hay una fila de capítulo sin código.
+    """
+    rnd = random.Random(seed)
+    wb = Workbook()
+    ws = wb.active
+    ws.append(["PRESUPUESTO SINTÉTICO"])
+    for _ in range(max(0, cabecera - 1)):
+        ws.append([])
+    ws.append(["Nº", "CÓDIGO", "UD", "RESUMEN", "CANTIDAD", "PRECIO", "IMPORTE"])
+    for i in range(n_filas):
+        if i % 20 == 0:
+            ws.append([None, None, None, f"CAPÍTULO {i // 20 + 1}"])
+            continue
+        if rnd.random() < faltantes:
+            codigo = codigo_seccion(len(codigos) + rnd.randrange(1000))
+        else:
+            codigo = rnd.choice(codigos)
+        cantidad = round(rnd.random() * 100, 2)
+        precio = round(rnd.random() * 50, 2)
+        ws.append([
+            i, f"{codigo}{rnd.choice(('', 'a', 'b', 'N'))}", rnd.choice(("m", "ud", "m2", "m3")),
+            f"Partida {i} de {codigo}", cantidad, precio, round(cantidad * precio, 2),
+        ])
+    wb.save(path)
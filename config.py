@@ -5,4 +5,24 @@
 EXCEL_INPUT_PATH = "partidas.xlsx"
 EXCEL_OUTPUT_PATH = r"ficheros\excel_result.json"
 WORD_OUTPUT_PATH = r"ficheros\word_result.docx"
-EXCEL_COLUMNS = ['CÓDIGO', 'UD', 'RESUMEN']
\ No newline at end of file
+EXCEL_COLUMNS = ['CÓDIGO', 'UD', 'RESUMEN']
+# A partir de este tamaño, la lista de códigos se lee del Excel en streaming con openpyxl
+# (ExcelFactory.iter_partidas) en lugar de cargar la hoja en pandas
+EXCEL_STREAMING_MIN_BYTES = 10 * 1024 * 1024
+
+# Caché de anexos ya generados (None para desactivarla)
+RESULT_CACHE_DIR = "ficheros/cache_anexos"
+RESULT_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+
+# Caché en memoria de secciones ya cargadas (document_cache.DocumentCache), por proceso.
+# Desactivada por defecto (0 entradas): solo compensa si muchos identificadores o anexos
+# comparten sección; se activa con --cache-secciones. El tamaño es la memoria estimada
+# de los documentos cargados (ver document_cache.tamaño_estimado).
+SECTION_CACHE_MAX_ITEMS = 0
+SECTION_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# Motores de fusión (ver test3.MOTORES); el directo y el streaming pasan a Composer
+# si una sección tiene contenido que no admiten
+MOTOR_DIRECTO = "directo"
+MOTOR_STREAMING = "streaming"
+MOTOR_COMPOSER = "composer"
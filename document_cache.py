@@ -0,0 +1,173 @@
+import copy
+import io
+import os
+import threading
+import zipfile
+from collections import OrderedDict
+from docx import Document
+from docx.opc.part import XmlPart
+from docx.opc.rel import Relationships
+from docx.shared import lazyproperty
+
+# Un árbol lxml ocupa en memoria unas 6 veces el XML del que sale (medido con secciones
+# reales); se redondea al alza. Las partes binarias (imágenes, fuentes) se guardan tal cual.
+FACTOR_MEMORIA_XML = 8
+
+
+def _copia_superficial(objeto):
+    """
+    copy.copy de una parte o paquete de python-docx, sin los valores ya calculados de sus
+    lazyproperty (rels, numbering_part...), que apuntarían a las partes del original.
+    """
+    copia = copy.copy(objeto)
+    for clase in type(objeto).__mro__:
+        for nombre, atributo in vars(clase).items():
+            if isinstance(atributo, lazyproperty):
+                copia.__dict__.pop(nombre, None)
+    return copia
+
+
+def copiar_documento(doc):
+    """
+    Devuelve una copia independiente de un Document de python-docx sin volver a leer el .docx:
+    se copia el árbol XML de cada parte (deepcopy de lxml, mucho más rápido que parsearlo)
+    y se comparte el contenido de las partes binarias (imágenes, fuentes), que no se modifica.
+    """
+    paquete = doc.part.package
+    nuevo = _copia_superficial(paquete)
+    copias = {}
+    for parte in paquete.iter_parts():
+        copia = _copia_superficial(parte)
+        copia._package = nuevo
+        if isinstance(parte, XmlPart):
+            copia._element = copy.deepcopy(parte._element)
+        copias[parte] = copia
+
+    for origen, destino in [(paquete, nuevo)] + list(copias.items()):
+        rels = Relationships(origen.rels._baseURI)
+        for rel in origen.rels.values():
+            objetivo = rel.target_ref if rel.is_external else copias[rel.target_part]
+            rels.add_relationship(rel.reltype, objetivo, rel.rId, rel.is_external)
+        # valor de la lazyproperty rels (y el atributo _rels que mantiene python-docx)
+        destino.__dict__["rels"] = rels
+        if "_rels" in vars(origen):
+            destino._rels = rels
+    return copias[doc.part].document
+
+
+def tamaño_estimado(fuente):
+    """
+    Memoria aproximada del documento una vez cargado con python-docx, a partir del directorio
+    central del zip (ruta o fichero en memoria): el tamaño descomprimido de cada parte XML por
+    FACTOR_MEMORIA_XML más el de las partes binarias.
+    """
+    with zipfile.ZipFile(fuente) as zf:
+        total = sum(
+            info.file_size * (FACTOR_MEMORIA_XML if info.filename.endswith((".xml", ".rels")) else 1)
+            for info in zf.infolist()
+        )
+    if isinstance(fuente, io.IOBase):
+        fuente.seek(0)
+    return total
+
+
+class DocumentCache:
+    """
+    Caché LRU en memoria de documentos .docx ya cargados con python-docx, con clave
+    ruta + fecha de modificación + tamaño (si el fichero cambia, la entrada deja de valer).
+    Lo que devuelve get se puede modificar libremente: el documento guardado nunca se entrega,
+    solo copias (ver copiar_documento).
+
+    Un documento solo se guarda la segunda vez que se pide: la primera se carga y se entrega
+    sin copiarlo, de modo que las secciones que se usan una sola vez no cuestan memoria ni
+    copias. Se limita por número de entradas (max_items) y por memoria estimada (max_bytes,
+    ver tamaño_estimado); al superar cualquiera se descartan las usadas hace más tiempo.
+    Con max_items=0 no guarda nada y get equivale a Document(ruta).
+    Se puede usar desde varios hilos a la vez.
+    """
+
+    def __init__(self, max_items=128, max_bytes=256 * 1024 * 1024):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self._entradas = OrderedDict()
+        # claves pedidas una vez y aún no guardadas (acotadas, las más antiguas se olvidan)
+        self._vistas = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.descartes = 0
+
+    def _clave(self, path):
+        st = os.stat(path)
+        return os.path.normcase(os.path.abspath(path)), st.st_mtime_ns, st.st_size
+
+    def get(self, path, fuente=None):
+        """
+        Devuelve el documento de path: una copia si está en la caché o, si no, el recién cargado.
+        fuente, si se indica, es lo que se pasa a Document() en lugar de path
+        (por ejemplo, el contenido del fichero ya leído en un BytesIO).
+        """
+        if self.max_items <= 0:
+            with self._lock:
+                self.fallos += 1
+            return Document(fuente if fuente is not None else path)
+
+        clave = self._clave(path)
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None:
+                self._entradas.move_to_end(clave)
+                self.aciertos += 1
+            else:
+                self.fallos += 1
+                admitir = self._vistas.pop(clave, False)
+                if not admitir:
+                    self._vistas[clave] = True
+                    while len(self._vistas) > 4 * self.max_items:
+                        self._vistas.popitem(last=False)
+        if entrada is not None:
+            return copiar_documento(entrada[0])
+
+        fuente = fuente if fuente is not None else path
+        if not admitir:
+            return Document(fuente)
+        tamaño = tamaño_estimado(fuente)
+        doc = Document(fuente)
+        with self._lock:
+            guardar = clave not in self._entradas and tamaño <= self.max_bytes
+            if guardar:
+                self._entradas[clave] = (doc, tamaño)
+                self._bytes += tamaño
+                self._evict()
+        # el documento guardado no se entrega: quien lo pida después debe recibirlo intacto
+        return copiar_documento(doc) if guardar else doc
+
+    def _evict(self):
+        while self._entradas and (len(self._entradas) > self.max_items or self._bytes > self.max_bytes):
+            _, (_, tamaño) = self._entradas.popitem(last=False)
+            self._bytes -= tamaño
+            self.descartes += 1
+
+    def clear(self):
+        """
+        Vacía la caché y pone a cero las estadísticas.
+        """
+        with self._lock:
+            self._entradas.clear()
+            self._vistas.clear()
+            self._bytes = 0
+            self.aciertos = self.fallos = self.descartes = 0
+
+    def estadisticas(self):
+        """
+        Aciertos, fallos y descartes acumulados, y entradas y bytes aproximados actuales.
+        """
+        with self._lock:
+            return {
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "descartes": self.descartes,
+                "entradas": len(self._entradas),
+                "bytes": self._bytes,
+            }
@@ -0,0 +1,221 @@
+import shutil
+import struct
+import tempfile
+import zlib
+from collections import namedtuple
+
+from docx.opc.oxml import CT_Relationships
+from docx.opc.packuri import CONTENT_TYPES_URI, PACKAGE_URI
+from docx.opc.pkgwriter import _ContentTypesItem
+
+# Fecha fija para las entradas del zip: así el mismo contenido produce siempre los mismos bytes,
+# independientemente del proceso o del momento en que se escriba el paquete.
+FECHA_ZIP = (1980, 1, 1, 0, 0, 0)
+
+_DOS_TIME = (FECHA_ZIP[3] << 11) | (FECHA_ZIP[4] << 5) | (FECHA_ZIP[5] // 2)
+_DOS_DATE = ((FECHA_ZIP[0] - 1980) << 9) | (FECHA_ZIP[1] << 5) | FECHA_ZIP[2]
+
+# Entrada ya comprimida (deflate sin cabecera), reutilizable en varios zips
+EntradaZip = namedtuple("EntradaZip", "crc tamano datos")
+
+
+def comprimir(blob):
+    """
+    Comprime blob con deflate (mismo nivel que zipfile.ZIP_DEFLATED) y devuelve una EntradaZip.
+    """
+    compresor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+    datos = compresor.compress(blob) + compresor.flush()
+    return EntradaZip(zlib.crc32(blob), len(blob), datos)
+
+
+class EntradaDiferida:
+    """
+    Entrada del zip cuyo contenido llega por partes: se comprime a medida que se escribe en un
+    fichero temporal y después se copia al zip con ZipWriter.write_stream, sin tenerla entera
+    en memoria (por ejemplo, el document.xml de un anexo muy grande).
+    """
+
+    def __init__(self):
+        self._compresor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+        self._fp = tempfile.TemporaryFile()
+        self.crc = 0
+        self.tamano = 0
+        self.tamano_comprimido = None
+
+    def write(self, datos):
+        self.crc = zlib.crc32(datos, self.crc)
+        self.tamano += len(datos)
+        self._fp.write(self._compresor.compress(datos))
+
+    def close(self):
+        """
+        Termina la compresión; la entrada queda lista para ZipWriter.write_stream.
+        """
+        if self.tamano_comprimido is None:
+            self._fp.write(self._compresor.flush())
+            self.tamano_comprimido = self._fp.tell()
+            self._fp.seek(0)
+
+    def descartar(self):
+        self._fp.close()
+
+
+class ZipWriter:
+    """
+    Escritor zip mínimo y determinista (fecha fija, sin campos extra) que admite
+    entradas ya comprimidas, para no volver a comprimir las partes compartidas
+    por muchos paquetes (estilos, numeración, imágenes...).
+    """
+
+    def __init__(self, destino):
+        self._propio = isinstance(destino, str)
+        self._fp = open(destino, "wb") if self._propio else destino
+        self._inicio = self._fp.tell() if not self._propio else 0
+        self._central = []
+
+    def _posicion(self):
+        return self._fp.tell() - self._inicio
+
+    def write(self, nombre, blob):
+        self.write_compressed(nombre, comprimir(blob))
+
+    def _cabecera(self, nombre, crc, comprimido, tamano):
+        nombre_b = nombre.encode("utf-8")
+        flags = 0x800 if not nombre.isascii() else 0
+        self._central.append((nombre_b, flags, crc, comprimido, tamano, self._posicion()))
+        self._fp.write(struct.pack(
+            "<IHHHHHIIIHH", 0x04034B50, 20, flags, 8, _DOS_TIME, _DOS_DATE,
+            crc, comprimido, tamano, len(nombre_b), 0,
+        ))
+        self._fp.write(nombre_b)
+
+    def write_compressed(self, nombre, entrada):
+        self._cabecera(nombre, entrada.crc, len(entrada.datos), entrada.tamano)
+        self._fp.write(entrada.datos)
+
+    def write_stream(self, nombre, entrada):
+        """
+        Escribe una EntradaDiferida copiando su fichero temporal por bloques, y lo cierra.
+        """
+        entrada.close()
+        self._cabecera(nombre, entrada.crc, entrada.tamano_comprimido, entrada.tamano)
+        shutil.copyfileobj(entrada._fp, self._fp)
+        entrada.descartar()
+
+    def close(self):
+        """
+        Escribe el directorio central y devuelve el tamaño total del zip en bytes.
+        """
+        inicio_central = self._posicion()
+        for nombre_b, flags, crc, comprimido, tamano, offset in self._central:
+            self._fp.write(struct.pack(
+                "<IHHHHHHIIIHHHHHII", 0x02014B50, 20, 20, flags, 8, _DOS_TIME, _DOS_DATE,
+                crc, comprimido, tamano, len(nombre_b), 0, 0, 0, 0, 0, offset,
+            ))
+            self._fp.write(nombre_b)
+        tamano_central = self._posicion() - inicio_central
+        self._fp.write(struct.pack(
+            "<IHHHHIIH", 0x06054B50, 0, 0, len(self._central), len(self._central),
+            tamano_central, inicio_central, 0,
+        ))
+        total = self._posicion()
+        if self._propio:
+            self._fp.close()
+        return total
+
+
+def rels_xml(rels):
+    """
+    Serializa una colección de relaciones (cualquier iterable de _Relationship) como fichero .rels.
+    """
+    rels_elm = CT_Relationships.new()
+    for rel in rels:
+        rels_elm.add_rel(rel.rId, rel.reltype, rel.target_ref, rel.is_external)
+    return rels_elm.xml
+
+
+def iter_package_parts(package, rels_por_parte=None):
+    """
+    Recorre en profundidad el grafo de relaciones del paquete, como OpcPackage.iter_parts,
+    pero permitiendo sustituir las relaciones de algunas partes (rels_por_parte: parte -> rels).
+    Las partes que solo eran alcanzables a través de relaciones eliminadas no se generan.
+    """
+    rels_por_parte = rels_por_parte or {}
+    vistas = set()
+
+    def recorrer(rels):
+        for rel in rels:
+            if rel.is_external:
+                continue
+            part = rel.target_part
+            if part in vistas:
+                continue
+            vistas.add(part)
+            yield part
+            yield from recorrer(rels_por_parte.get(part, part.rels.values()))
+
+    yield from recorrer(package.rels.values())
+
+
+def write_package(
+    package, destino, rels_por_parte=None, blobs=None, comprimidas=None, omitir=(), diferidas=None,
+):
+    """
+    Escribe el paquete OPC en destino (ruta, fichero binario o un ZipWriter ya abierto, que
+    puede tener entradas escritas antes) de forma reproducible.
+
+    Args:
+        rels_por_parte (dict): Relaciones que sustituyen a las de ciertas partes (ver iter_package_parts).
+        blobs (dict): Contenido que sustituye al de ciertas partes (parte -> bytes).
+        comprimidas (dict): Caché de entradas ya comprimidas, por nombre de miembro del zip, de las
+            partes que no cambian entre llamadas; se rellena al escribir y se reutiliza después.
+        omitir (set): Partes cuyo contenido ya está en el zip; solo se escriben sus relaciones.
+        diferidas (dict): Contenido de ciertas partes como EntradaDiferida (parte -> entrada).
+
+    Returns:
+        int: Bytes escritos.
+    """
+    rels_por_parte = rels_por_parte or {}
+    blobs = blobs or {}
+    diferidas = diferidas or {}
+    parts = list(iter_package_parts(package, rels_por_parte))
+    zw = destino if isinstance(destino, ZipWriter) else ZipWriter(destino)
+    zw.write(CONTENT_TYPES_URI.membername, _ContentTypesItem.from_parts(parts).blob)
+
+    def escribir_fija(nombre, obtener_blob):
+        if comprimidas is None:
+            zw.write(nombre, obtener_blob())
+            return
+        entrada = comprimidas.get(nombre)
+        if entrada is None:
+            entrada = comprimidas[nombre] = comprimir(obtener_blob())
+        zw.write_compressed(nombre, entrada)
+
+    escribir_fija(PACKAGE_URI.rels_uri.membername, lambda: package.rels.xml)
+    for part in parts:
+        nombre = part.partname.membername
+        if part in omitir:
+            pass
+        elif part in diferidas:
+            zw.write_stream(nombre, diferidas[part])
+        elif part in blobs:
+            zw.write(nombre, blobs[part])
+        else:
+            escribir_fija(nombre, lambda: part.blob)
+        if part in rels_por_parte:
+            rels = list(rels_por_parte[part])
+            if rels:
+                zw.write(part.partname.rels_uri.membername, rels_xml(rels))
+        elif len(part.rels):
+            escribir_fija(part.partname.rels_uri.membername, lambda: part.rels.xml)
+    return zw.close()
+
+
+def guardar_docx(doc, destino):
+    """
+    Equivalente a doc.save(destino) pero con salida reproducible byte a byte.
+    """
+    package = doc.part.package
+    for part in package.parts:
+        part.before_marshal()
+    return write_package(package, destino)
@@ -0,0 +1,582 @@
+import os
+import re
+import shutil
+import tempfile
+import zlib
+from copy import deepcopy
+from docx.opc.constants import CONTENT_TYPE as CT
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.opc.packuri import PackURI
+from docx.opc.part import Part
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsmap, qn
+from docx.parts.image import ImagePart
+from docx.parts.numbering import NumberingPart
+from docx.styles import BabelFish
+from docxcompose import composer as _composer
+from docxcompose.image import ImageWrapper
+from docxcompose.properties import CustomProperties
+from docx_package import EntradaDiferida, ZipWriter, write_package
+from lxml import etree
+
+R_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+W_VAL = qn("w:val")
+TAG_SECTPR = qn("w:sectPr")
+TAG_PPR = qn("w:pPr")
+TAG_PSTYLE = qn("w:pStyle")
+TAG_NUMPR = qn("w:numPr")
+TAG_NUMID = qn("w:numId")
+TAG_NUM = qn("w:num")
+TAG_ABSTRACTNUM = qn("w:abstractNum")
+TAG_ABSTRACTNUMID = qn("w:abstractNumId")
+TAGS_ESTILO = (qn("w:pStyle"), qn("w:rStyle"), qn("w:tblStyle"))
+TAGS_CABECERA_PIE = (qn("w:headerReference"), qn("w:footerReference"))
+# Identificadores que se renumeran en el documento completo: atributo y primer valor de cada uno
+IDS_RENUMERADOS = {
+    qn("w:bookmarkStart"): (qn("w:id"), 0),
+    qn("w:bookmarkEnd"): (qn("w:id"), 0),
+    qn("wp:docPr"): ("id", 1),
+    qn("pic:cNvPr"): ("id", 1),
+}
+
+# Mismo patrón que docxcompose para numerar las partes copiadas (chart1.xml, chart2.xml...)
+NOMBRE_PARTE_RE = re.compile("([a-zA-Z/_-]+)([1-9][0-9]*)?")
+# Contenido de una sección que los ensambladores directos no combinan (ver comprobar_body)
+XPATH_APARTADOS = etree.XPath("./w:p/w:pPr/w:sectPr | ./w:sectPr", namespaces=nsmap)
+XPATH_NOTAS = etree.XPath(".//w:footnoteReference", namespaces=nsmap)
+
+
+class ContenidoNoSoportado(Exception):
+    """
+    La sección contiene algo que el ensamblador directo no sabe combinar (notas al pie,
+    varios apartados con saltos de sección); hay que usar docxcompose.Composer.
+    """
+
+
+def comprobar_body(body):
+    """
+    Lanza ContenidoNoSoportado si el body de una sección tiene contenido que
+    EnsambladorDirecto no sabe combinar.
+    """
+    if len(XPATH_APARTADOS(body)) > 1:
+        raise ContenidoNoSoportado("la sección tiene varios apartados (saltos de sección)")
+    if XPATH_NOTAS(body):
+        raise ContenidoNoSoportado("la sección tiene notas al pie")
+
+
+class EnsambladorDirecto:
+    """
+    Alternativa a docxcompose.Composer para el caso de este proyecto: todas las secciones
+    salen del mismo documento maestro y comparten estilos y numeración.
+
+    Sigue las mismas reglas que Composer.append (estilos por nombre, copia de la numeración
+    usada con reinicio de la primera lista, imágenes deduplicadas por SHA-1, eliminación de las
+    referencias a cabeceras y pies), pero:
+    - mueve los elementos de cada sección en lugar de copiarlos (la sección se descarta después);
+    - recuerda los estilos, imágenes y relaciones ya resueltos en lugar de buscarlos en el
+      documento que va creciendo;
+    - inserta todo en el body, la numeración nueva y la renumeración de marcadores y dibujos
+      una sola vez, al guardar.
+    """
+
+    def __init__(self, doc):
+        self.doc = doc
+        self.pkg = doc.part.package
+        self._pendientes = []
+
+        estilos = list(doc.styles)
+        self._ids_estilo = {s.style_id for s in estilos}
+        self._nombre_a_id = {s.name: s.style_id for s in estilos}
+        self._estilos = {}
+
+        self._numbering = None
+        self._nums = {}
+        self._anums = {}
+        self._nums_nuevos = []
+        self._anums_nuevos = []
+
+        self._imagenes = {p.sha1: p for p in self.pkg.image_parts}
+        self._rids_imagen = {}
+        self._rids_externos = {}
+        self._siguiente_rid = 1
+        self._partes_usadas = {p.partname for p in self.pkg.iter_parts()}
+        self._siguiente_parte = {}
+
+    def append(self, doc):
+        """
+        Añade al final el contenido de doc (salvo el sectPr del body). doc queda vacío.
+        """
+        body = doc.element.body
+        comprobar_body(body)
+
+        # igual que Composer: los campos de propiedades personalizadas se sustituyen por su valor
+        try:
+            doc.part.package.part_related_by(RT.CUSTOM_PROPERTIES)
+        except KeyError:
+            pass
+        else:
+            cprops = CustomProperties(doc)
+            for name in cprops.keys():
+                cprops.dissolve_fields(name)
+
+        rids = {}
+        num_map = {}
+        anum_map = {}
+        reiniciados = set()
+        origen = {}
+        for element in list(body):
+            if element.tag == TAG_SECTPR:
+                continue
+            self._mapear_relaciones(doc.part, element, rids)
+            self._mapear_estilos(doc, element, num_map, anum_map, origen)
+            self._mapear_numeracion(doc, element, num_map, anum_map, origen)
+            self._reiniciar_numeracion(element, num_map, reiniciados)
+            for ref in list(element.iter(*TAGS_CABECERA_PIE)):
+                ref.getparent().remove(ref)
+            self._pendientes.append(element)
+
+    def save(self, filename):
+        self.finalizar()
+        self.doc.save(filename)
+
+    def finalizar(self):
+        """
+        Inserta en el documento base todo lo añadido desde la última llamada.
+        """
+        body = self.doc.element.body
+        sectpr = body.find(TAG_SECTPR)
+        indice = body.index(sectpr) if sectpr is not None else len(body)
+        body[indice:indice] = self._pendientes
+        self._pendientes = []
+        self._insertar_numeracion()
+        self._renumerar()
+
+    def _insertar_numeracion(self):
+        """
+        Añade a numbering.xml las listas nuevas (abstractNum antes de los w:num, como exige el esquema).
+        """
+        if self._anums_nuevos or self._nums_nuevos:
+            numbering = self._numbering
+            nums = numbering.findall(TAG_NUM)
+            indice = numbering.index(nums[0]) if nums else len(numbering)
+            numbering[indice:indice] = self._anums_nuevos
+            nums = numbering.findall(TAG_NUM)
+            indice = numbering.index(nums[-1]) + 1 if nums else len(numbering)
+            numbering[indice:indice] = self._nums_nuevos
+            self._anums_nuevos = []
+            self._nums_nuevos = []
+
+    # --- relaciones ---------------------------------------------------------------
+
+    def _relacionar(self, reltype, target, externa=False):
+        rels = self.doc.part.rels
+        while f"rId{self._siguiente_rid}" in rels:
+            self._siguiente_rid += 1
+        return rels.add_relationship(reltype, target, f"rId{self._siguiente_rid}", externa).rId
+
+    def _mapear_relaciones(self, src_part, element, rids):
+        """
+        Cambia los r:id, r:embed, r:link... de element por relaciones equivalentes del documento base.
+        """
+        for el in element.iter(etree.Element):
+            for nombre, valor in el.attrib.items():
+                if not nombre.startswith(R_NS):
+                    continue
+                if valor not in rids:
+                    rel = src_part.rels.get(valor)
+                    rids[valor] = self._copiar_relacion(rel) if rel is not None else None
+                nuevo = rids[valor]
+                if nuevo is not None and nuevo != valor:
+                    el.set(nombre, nuevo)
+
+    def _copiar_relacion(self, rel):
+        if rel.reltype in (RT.HEADER, RT.FOOTER):
+            # sus referencias se eliminan después, como en Composer
+            return None
+        if rel.is_external:
+            clave = (rel.reltype, rel.target_ref)
+            if clave not in self._rids_externos:
+                self._rids_externos[clave] = self.doc.part.rels.get_or_add_ext_rel(*clave)
+            return self._rids_externos[clave]
+        if rel.reltype == RT.IMAGE:
+            return self._rid_imagen(rel.target_part)
+        return self._relacionar(rel.reltype, self._copiar_parte(rel.target_part))
+
+    def _rid_imagen(self, img_part):
+        sha1 = img_part.sha1
+        rid = self._rids_imagen.get(sha1)
+        if rid is None:
+            parte = self._imagenes.get(sha1)
+            if parte is None:
+                parte = self._imagenes[sha1] = self.pkg.image_parts._add_image_part(ImageWrapper(img_part))
+                rid = self._relacionar(RT.IMAGE, parte)
+            else:
+                rid = self.doc.part.relate_to(parte, RT.IMAGE)
+            self._rids_imagen[sha1] = rid
+        return rid
+
+    def _copiar_parte(self, part):
+        """
+        Copia part (y, recursivamente, las partes que relaciona) con el siguiente nombre libre.
+        """
+        nombre = NOMBRE_PARTE_RE.match(part.partname).group(1)
+        n = self._siguiente_parte.get(nombre, 1)
+        while PackURI(f"{nombre}{n}.{part.partname.ext}") in self._partes_usadas:
+            n += 1
+        self._siguiente_parte[nombre] = n + 1
+        partname = PackURI(f"{nombre}{n}.{part.partname.ext}")
+        self._partes_usadas.add(partname)
+
+        nueva = Part(partname, part.content_type, part.blob, self.pkg)
+        for rel in part.rels.values():
+            target = rel.target_ref if rel.is_external else self._copiar_parte(rel.target_part)
+            nueva.rels.add_relationship(rel.reltype, target, rel.rId, rel.is_external)
+        return nueva
+
+    # --- estilos -------------------------------------------------------------------
+
+    def _mapear_estilos(self, doc, element, num_map, anum_map, origen):
+        """
+        Traduce los ids de estilo de element a los del documento base (por nombre, como Composer)
+        y copia al base los estilos que no tenga. Cada estilo se resuelve una sola vez.
+        """
+        por_id = {}
+        for el in element.iter(*TAGS_ESTILO):
+            por_id.setdefault(el.get(W_VAL), []).append(el)
+        for style_id, elementos in por_id.items():
+            src = doc.styles.element.get_by_id(style_id)
+            nombre = self._nombre_estilo(src)
+            clave = (style_id, nombre)
+            if clave not in self._estilos:
+                self._estilos[clave] = self._resolver_estilo(doc, src, style_id, nombre, num_map, anum_map, origen)
+            nuestro, anums = self._estilos[clave]
+            anum_map.update(anums)
+            if nuestro != style_id:
+                for el in elementos:
+                    el.set(W_VAL, nuestro)
+
+    def _nombre_estilo(self, estilo):
+        # mismo nombre que Style.name, con el que Composer relaciona los estilos
+        if estilo is None or estilo.name_val is None:
+            return None
+        return BabelFish.internal2ui(estilo.name_val)
+
+    def _resolver_estilo(self, doc, src, style_id, nombre, num_map, anum_map, origen):
+        if src is None:
+            return style_id, {}
+        nuestro = self._nombre_a_id.get(nombre, style_id)
+        anums = {}
+        if nuestro not in self._ids_estilo:
+            copia = deepcopy(src)
+            self.doc.styles.element.append(copia)
+            self._ids_estilo.add(copia.styleId)
+            self._nombre_a_id.setdefault(nombre, copia.styleId)
+            self._mapear_numeracion(doc, copia, num_map, anum_map, origen)
+            enlazados = copia.xpath("./w:link/@w:val")
+            enlazado = doc.styles.element.get_by_id(enlazados[0]) if enlazados else None
+            if enlazado is not None:
+                nombre_enlazado = self._nombre_estilo(enlazado)
+                if self._nombre_a_id.get(nombre_enlazado, enlazado.styleId) not in self._ids_estilo:
+                    self.doc.styles.element.append(deepcopy(enlazado))
+                    self._ids_estilo.add(enlazado.styleId)
+                    self._nombre_a_id.setdefault(nombre_enlazado, enlazado.styleId)
+        else:
+            # listas del estilo: se reutiliza el abstractNum del base en vez de copiar el de la sección
+            src_nums = src.xpath(".//w:numId/@w:val")
+            nuestro_estilo = self.doc.styles.element.get_by_id(nuestro)
+            nuestros_nums = nuestro_estilo.xpath(".//w:numId/@w:val") if nuestro_estilo is not None else []
+            if src_nums and nuestros_nums:
+                src_num = self._indice_origen(doc, origen)[0].get(src_nums[0])
+                nuestro_num = self._numeracion()[0].get(nuestros_nums[0])
+                if src_num is not None and nuestro_num is not None:
+                    anums[src_num.find(TAG_ABSTRACTNUMID).get(W_VAL)] = nuestro_num.find(TAG_ABSTRACTNUMID).get(W_VAL)
+        return nuestro, anums
+
+    # --- numeración ----------------------------------------------------------------
+
+    def _numeracion(self):
+        """
+        Índices (nums, abstractNums) de la numeración del documento base, creándola si no existe.
+        """
+        if self._numbering is None:
+            try:
+                part = self.doc.part.rels.part_with_reltype(RT.NUMBERING)
+            except KeyError:
+                plantilla = os.path.join(os.path.dirname(_composer.__file__), "templates", "numbering.xml")
+                with open(plantilla, "rb") as f:
+                    element = parse_xml(f.read())
+                part = NumberingPart(PackURI("/word/numbering.xml"), CT.WML_NUMBERING, element, self.pkg)
+                self.doc.part.relate_to(part, RT.NUMBERING)
+            self._numbering = part.element
+            self._nums = {n.get(qn("w:numId")): n for n in self._numbering.iterchildren(TAG_NUM)}
+            self._anums = {
+                a.get(qn("w:abstractNumId")): a for a in self._numbering.iterchildren(TAG_ABSTRACTNUM)
+            }
+            self._siguiente_num = max((int(n) for n in self._nums), default=0) + 1
+            self._siguiente_anum = max((int(a) for a in self._anums), default=-1) + 1
+        return self._nums, self._anums
+
+    def _indice_origen(self, doc, origen):
+        if "nums" not in origen:
+            try:
+                numbering = doc.part.rels.part_with_reltype(RT.NUMBERING).element
+            except KeyError:
+                origen["nums"], origen["anums"] = {}, {}
+            else:
+                origen["nums"] = {n.get(qn("w:numId")): n for n in numbering.iterchildren(TAG_NUM)}
+                origen["anums"] = {a.get(qn("w:abstractNumId")): a for a in numbering.iterchildren(TAG_ABSTRACTNUM)}
+        return origen["nums"], origen["anums"]
+
+    def _mapear_numeracion(self, doc, element, num_map, anum_map, origen):
+        """
+        Copia al base las listas (w:num y su w:abstractNum) que usa element, con ids nuevos,
+        y actualiza las referencias. Como en Composer, cada sección tiene sus propias listas.
+        """
+        refs = list(element.iter(TAG_NUMID))
+        if not refs:
+            return
+        nums, anums = self._numeracion()
+        src_nums, src_anums = self._indice_origen(doc, origen)
+        for ref in refs:
+            num_id = ref.get(W_VAL)
+            if num_id in num_map or num_id not in src_nums:
+                continue
+            nuevo = deepcopy(src_nums[num_id])
+            anum_ref = nuevo.find(TAG_ABSTRACTNUMID)
+            src_anum_id = anum_ref.get(W_VAL)
+            if src_anum_id not in anum_map:
+                if src_anum_id not in src_anums:
+                    continue
+                copia = deepcopy(src_anums[src_anum_id])
+                nuevo_anum = str(self._siguiente_anum)
+                self._siguiente_anum += 1
+                copia.set(qn("w:abstractNumId"), nuevo_anum)
+                # nsid distinto para que Word reinicie la lista (determinista, a diferencia de Composer)
+                nsid = copia.find(qn("w:nsid"))
+                if nsid is not None:
+                    nsid.set(W_VAL, f"{zlib.crc32(f'{src_anum_id}:{nuevo_anum}'.encode()):08X}")
+                anum_map[src_anum_id] = nuevo_anum
+                anums[nuevo_anum] = copia
+                self._anums_nuevos.append(copia)
+            anum_ref.set(W_VAL, anum_map[src_anum_id])
+            nuevo_id = str(self._siguiente_num)
+            self._siguiente_num += 1
+            nuevo.set(qn("w:numId"), nuevo_id)
+            num_map[num_id] = nuevo_id
+            nums[nuevo_id] = nuevo
+            self._nums_nuevos.append(nuevo)
+        for ref in refs:
+            ref.set(W_VAL, num_map.get(ref.get(W_VAL), ref.get(W_VAL)))
+
+    def _reiniciar_numeracion(self, element, num_map, reiniciados):
+        """
+        Igual que Composer.restart_first_numbering: la primera lista numerada (no viñetas ni
+        títulos) de cada estilo vuelve a empezar en 1 en cada sección.
+        """
+        pstyle = next(element.iter(TAG_PSTYLE), None)
+        if pstyle is None:
+            return
+        style_id = pstyle.get(W_VAL)
+        if style_id in reiniciados:
+            return
+        estilo = self.doc.styles.element.get_by_id(style_id)
+        if estilo is None or estilo.xpath(".//w:outlineLvl"):
+            return
+
+        local = [ref for ref in element.iter(TAG_NUMID) if ref.getparent().tag == TAG_NUMPR]
+        if local:
+            num_id = local[0].get(W_VAL)
+        else:
+            del_estilo = estilo.xpath(".//w:numId/@w:val")
+            if not del_estilo:
+                return
+            num_id = del_estilo[0]
+
+        nums, anums = self._numeracion()
+        num = nums.get(num_id)
+        if num is None:
+            return
+        anum = anums.get(num.find(TAG_ABSTRACTNUMID).get(W_VAL))
+        if anum is None:
+            return
+        formato = anum.xpath('./w:lvl[@w:ilvl="0"]/w:numFmt/@w:val', namespaces=nsmap)
+        if formato and formato[0] == "bullet":
+            return
+
+        nuevo = deepcopy(num)
+        nuevo.append(parse_xml(
+            '<w:lvlOverride xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"'
+            ' w:ilvl="0"><w:startOverride w:val="1"/></w:lvlOverride>'
+        ))
+        nuevo_id = str(self._siguiente_num)
+        self._siguiente_num += 1
+        nuevo.set(qn("w:numId"), nuevo_id)
+        nums[nuevo_id] = nuevo
+        self._nums_nuevos.append(nuevo)
+
+        ppr = next(
+            (p for p in element.iter(TAG_PPR) if p.find(TAG_PSTYLE) is not None and p.find(TAG_PSTYLE).get(W_VAL) == style_id),
+            None,
+        )
+        num_pr = next(ppr.iter(TAG_NUMPR), None) if ppr is not None else None
+        if num_pr is not None and num_pr.find(TAG_NUMID) is not None:
+            anterior = num_pr.find(TAG_NUMID).get(W_VAL)
+            for clave, valor in num_map.items():
+                if valor == anterior:
+                    num_map[clave] = nuevo_id
+                    break
+            num_pr.find(TAG_NUMID).set(W_VAL, nuevo_id)
+        elif ppr is not None:
+            ppr.append(parse_xml(
+                '<w:numPr xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+                f'<w:ilvl w:val="0"/><w:numId w:val="{nuevo_id}"/></w:numPr>'
+            ))
+        reiniciados.add(style_id)
+
+    # --- identificadores ------------------------------------------------------------
+
+    def _renumerar(self):
+        """
+        Renumera marcadores y dibujos del documento completo, como hace Composer tras cada append.
+        """
+        body = self.doc.element.body
+        for tag in (qn("w:bookmarkStart"), qn("w:bookmarkEnd")):
+            for i, el in enumerate(body.iter(tag)):
+                el.set(qn("w:id"), str(i))
+
+        cabeceras_pies = [
+            rel.target_part.element for rel in self.doc.part.rels.values()
+            if rel.reltype in (RT.HEADER, RT.FOOTER) and not rel.is_external
+        ]
+        for tag in (qn("wp:docPr"), qn("pic:cNvPr")):
+            n = 1
+            for raiz in [body] + cabeceras_pies:
+                for el in raiz.iter(tag):
+                    el.set("id", str(n))
+                    n += 1
+
+
+class EnsambladorStreaming(EnsambladorDirecto):
+    """
+    EnsambladorDirecto con memoria acotada, para anexos de miles de secciones.
+
+    En lugar de acumular las secciones en el documento base hasta save, cada append serializa
+    los elementos de la sección y los comprime en el word/document.xml de salida (una
+    EntradaDiferida, en un fichero temporal), y las imágenes y demás partes binarias nuevas
+    se escriben en el zip en cuanto aparecen y se descarta su contenido. En memoria solo
+    quedan la sección en curso, los estilos, la numeración y las relaciones.
+
+    Marcadores y dibujos se renumeran sección a sección, en el mismo orden que _renumerar,
+    así que el anexo es el mismo que con EnsambladorDirecto. El zip se escribe en un fichero
+    temporal que save mueve a su destino; si la fusión no termina, descartar lo elimina.
+    """
+
+    def __init__(self, doc):
+        super().__init__(doc)
+        self._ids = {tag: inicial for tag, (_, inicial) in IDS_RENUMERADOS.items()}
+        self._escritas = set()
+        self._por_escribir = []
+        fd, self._temporal = tempfile.mkstemp(suffix=".docx")
+        os.close(fd)
+        self._zip = ZipWriter(self._temporal)
+        self._documento = EntradaDiferida()
+
+        # el contenido del base se escribe ya; el sectPr y el cierre del documento, en save
+        root = doc.element
+        body = root.body
+        sectpr = body.find(TAG_SECTPR)
+        contenido = [el for el in body if el is not sectpr]
+        self._renumerar_elementos(contenido)
+        marca = etree.Comment("secciones")
+        if sectpr is not None:
+            sectpr.addprevious(marca)
+        else:
+            body.append(marca)
+        xml = etree.tostring(root, encoding="UTF-8", standalone=True)
+        cabeza, self._cola = xml.split(b"<!--secciones-->")
+        self._documento.write(cabeza)
+        body.remove(marca)
+        for el in contenido:
+            body.remove(el)
+        # los elementos se serializan dentro de un w:body con los espacios de nombres del
+        # documento, para que no repitan sus declaraciones
+        self._envoltorio = etree.Element(qn("w:body"), nsmap=root.nsmap)
+
+    def append(self, doc):
+        super().append(doc)
+        elementos, self._pendientes = self._pendientes, []
+        self._escribir_elementos(elementos)
+        for parte in self._por_escribir:
+            if parte in self._escritas:
+                continue
+            self._zip.write(parte.partname.membername, parte.blob)
+            self._escritas.add(parte)
+            parte._blob = None
+            if isinstance(parte, ImagePart):
+                parte._image = None
+        self._por_escribir = []
+        self._liberar(doc)
+
+    def save(self, filename):
+        self._insertar_numeracion()
+        # los dibujos de cabeceras y pies siguen la numeración del cuerpo, como en _renumerar
+        for rel in self.doc.part.rels.values():
+            if rel.reltype in (RT.HEADER, RT.FOOTER) and not rel.is_external:
+                for el in rel.target_part.element.iter(qn("wp:docPr"), qn("pic:cNvPr")):
+                    el.set("id", str(self._ids[el.tag]))
+                    self._ids[el.tag] += 1
+        self._documento.write(self._cola)
+
+        for part in self.pkg.parts:
+            part.before_marshal()
+        write_package(
+            self.pkg, self._zip, omitir=self._escritas, diferidas={self.doc.part: self._documento},
+        )
+        shutil.move(self._temporal, filename)
+
+    def descartar(self):
+        """
+        Elimina el fichero temporal de una fusión que no se va a guardar.
+        """
+        self._zip._fp.close()
+        self._documento.descartar()
+        if os.path.exists(self._temporal):
+            os.remove(self._temporal)
+
+    def _escribir_elementos(self, elementos):
+        if not elementos:
+            return
+        self._renumerar_elementos(elementos)
+        self._envoltorio.extend(elementos)
+        xml = etree.tostring(self._envoltorio, encoding="UTF-8")
+        self._documento.write(xml[xml.index(b">") + 1:-len(b"</w:body>")])
+        for el in list(self._envoltorio):
+            self._envoltorio.remove(el)
+
+    def _liberar(self, doc):
+        """
+        Rompe los ciclos de referencias de la sección ya añadida (paquete <-> partes <-> relaciones,
+        documento <-> su _Body) para que se libere en cuanto se suelte, sin esperar al recolector
+        de ciclos: con miles de secciones, esa basura pendiente es lo que más memoria ocupa.
+        """
+        paquete = doc.part.package
+        for parte in list(paquete.iter_parts()):
+            vars(parte).clear()
+        vars(paquete).clear()
+        vars(doc).clear()
+
+    def _renumerar_elementos(self, elementos):
+        for elemento in elementos:
+            for el in elemento.iter(*IDS_RENUMERADOS):
+                el.set(IDS_RENUMERADOS[el.tag][0], str(self._ids[el.tag]))
+                self._ids[el.tag] += 1
+
+    def _rid_imagen(self, img_part):
+        rid = super()._rid_imagen(img_part)
+        self._por_escribir.append(self._imagenes[img_part.sha1])
+        return rid
+
+    def _copiar_parte(self, part):
+        nueva = super()._copiar_parte(part)
+        self._por_escribir.append(nueva)
+        return nueva
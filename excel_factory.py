@@ -1,114 +1,283 @@
 import pandas as pd
 import os
-from config import EXCEL_COLUMNS, EXCEL_OUTPUT_PATH
+import re
+import hashlib
+import pickle
+import time
+from openpyxl import load_workbook
+from config import EXCEL_COLUMNS, EXCEL_OUTPUT_PATH, EXCEL_STREAMING_MIN_BYTES
+from progress import ETAPA_EXCEL, como_progreso
+
+# Partidas ya cargadas en este proceso, por (ruta, mtime, tamaño, encabezado, columnas)
+_PARTIDAS_CACHE = {}
+# Filas en las que se busca el encabezado antes de recorrer la hoja completa
+HEADER_SCAN_ROWS = 50
+
+
+class Partidas:
+    """
+    Partidas de un Excel ya limpias: encabezado detectado, filas anteriores eliminadas
+    y sin filas vacías en la columna del encabezado. Se carga una vez y sirve tanto
+    para la lista de códigos como para los registros JSON.
+    """
+
+    def __init__(self, tabla, heading_text="CÓDIGO"):
+        self.tabla = tabla
+        self.heading_text = heading_text
+
+    def to_list(self, columns_to_keep="CÓDIGO"):
+        """
+        Devuelve los valores de la columna indicada ordenados alfabéticamente.
+        """
+        partidas = self.tabla
+        if columns_to_keep:
+            partidas = partidas[columns_to_keep]
+        return partidas.sort_values().tolist()
+
+    def to_dataframe(self, columns=EXCEL_COLUMNS):
+        """
+        Devuelve las columnas indicadas (solo las que existan) ordenadas por la columna del encabezado.
+        """
+        partidas = self.tabla
+        if columns:
+            # Asegurarse de que solo se incluyan columnas que existen en el DataFrame
+            columns_to_keep = [col for col in columns if col in partidas.columns]
+            if columns_to_keep:
+                partidas = partidas[columns_to_keep]
+        return partidas.sort_values(by=self.heading_text)
+
+    def to_records(self, columns=EXCEL_COLUMNS):
+        """
+        Devuelve las partidas como lista de diccionarios, igual que el JSON generado.
+        """
+        return self.to_dataframe(columns).to_dict(orient="records")
+
 
 class ExcelFactory:
-    def __init__(self, excel_path=None):
+    def __init__(self, excel_path=None, cache_dir=None):
         """
         Inicializa la clase ExcelFactory con la ruta al archivo de Excel.
+        Si se indica cache_dir, las partidas limpias se guardan también en disco
+        para no volver a abrir el Excel mientras no cambie.
         """
         self.excel_path = excel_path
-    
-    def excel_to_json(self, heading_text="CÓDIGO"):
+        self.cache_dir = cache_dir
+
+    def _clave_cache(self, heading_text, columnas):
+        stat = os.stat(self.excel_path)
+        return (os.path.abspath(self.excel_path), stat.st_mtime_ns, stat.st_size, heading_text, columnas)
+
+    def _ruta_cache_disco(self, clave):
+        resumen = hashlib.sha1(repr(clave).encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"partidas_{resumen}.pkl")
+
+    def _buscar_encabezado(self, filas, heading_text):
+        """
+        Devuelve la posición de la primera fila que contiene heading_text en alguna celda, o None.
+        La búsqueda se hace columna a columna con operaciones vectorizadas de pandas.
+        """
+        contiene = filas.astype(str).apply(lambda col: col.str.contains(heading_text)).any(axis=1)
+        if not contiene.any():
+            return None
+        return int(contiene.to_numpy().argmax())
+
+    def _leer_partidas(self, heading_text, columnas=None):
+        # Localizar el encabezado leyendo solo las primeras filas de la hoja
+        muestra = pd.read_excel(self.excel_path, header=None, nrows=HEADER_SCAN_ROWS, dtype=object)
+        header_row_index = self._buscar_encabezado(muestra, heading_text)
+        if header_row_index is None and len(muestra) >= HEADER_SCAN_ROWS:
+            # Encabezado más abajo de lo habitual: se busca en toda la hoja
+            muestra = pd.read_excel(self.excel_path, header=None, dtype=object)
+            header_row_index = self._buscar_encabezado(muestra, heading_text)
+        if header_row_index is None:
+            raise ValueError(f"No se encontró el encabezado '{heading_text}' en {self.excel_path}")
+
+        # Con el encabezado localizado, leer solo las columnas necesarias a partir de esa fila
+        nombres = [str(v) for v in muestra.iloc[header_row_index] if not pd.isna(v)]
+        usecols = None
+        if columnas:
+            usecols = [n for n in nombres if n in columnas] or None
+        partidas = pd.read_excel(self.excel_path, header=header_row_index, usecols=usecols, dtype=object)
+
+        # Eliminar las filas que contienen valores nulos en la columna del encabezado
+        return partidas.dropna(subset=[heading_text])
+
+    def _columnas_necesarias(self, heading_text, *extra):
+        """
+        Columnas que se conservan en caché: EXCEL_COLUMNS más el encabezado y las columnas extra.
+        """
+        columnas = list(EXCEL_COLUMNS or [])
+        for col in (heading_text,) + extra:
+            if col and col not in columnas:
+                columnas.append(col)
+        return tuple(columnas)
+
+    def cargar_partidas(self, heading_text="CÓDIGO", columnas=None, progreso=None):
+        """
+        Devuelve las Partidas del Excel, leyéndolo solo la primera vez.
+        La caché se invalida si cambia la ruta, la fecha de modificación o el tamaño del fichero.
+
+        Args:
+            heading_text (str): Texto que debe contener el encabezado. Por defecto, "CÓDIGO".
+            columnas (tuple): Columnas que se leen del Excel. Por defecto, EXCEL_COLUMNS y el encabezado.
+            progreso: Receptor de los avisos de la caché en disco (ver progress.como_progreso).
+
+        Returns:
+            Partidas: Partidas limpias del Excel.
+        """
+        if not self.excel_path or not os.path.exists(self.excel_path):
+            raise FileNotFoundError(f"No se encontró el archivo: {self.excel_path}")
+
+        if columnas is None:
+            columnas = self._columnas_necesarias(heading_text)
+        clave = self._clave_cache(heading_text, columnas)
+        partidas = _PARTIDAS_CACHE.get(clave)
+        if partidas is not None:
+            return partidas
+
+        ruta_disco = self._ruta_cache_disco(clave) if self.cache_dir else None
+        if ruta_disco and os.path.exists(ruta_disco):
+            try:
+                with open(ruta_disco, "rb") as f:
+                    partidas = Partidas(pickle.load(f), heading_text)
+            except Exception as e:
+                como_progreso(progreso).aviso(
+                    ETAPA_EXCEL, f"Aviso: no se pudo leer la caché de partidas '{ruta_disco}': {e}"
+                )
+
+        if partidas is None:
+            partidas = Partidas(self._leer_partidas(heading_text, columnas), heading_text)
+            if ruta_disco:
+                try:
+                    os.makedirs(self.cache_dir, exist_ok=True)
+                    with open(ruta_disco, "wb") as f:
+                        pickle.dump(partidas.tabla, f, protocol=pickle.HIGHEST_PROTOCOL)
+                except OSError as e:
+                    como_progreso(progreso).aviso(
+                        ETAPA_EXCEL, f"Aviso: no se pudo guardar la caché de partidas '{ruta_disco}': {e}"
+                    )
+
+        _PARTIDAS_CACHE[clave] = partidas
+        return partidas
+
+    def iter_partidas(self, heading_text="CÓDIGO", columnas=EXCEL_COLUMNS):
+        """
+        Recorre la primera hoja del Excel en modo solo lectura de openpyxl y genera, fila a fila,
+        un diccionario con las columnas indicadas de cada partida (las filas sin valor en la
+        columna del encabezado se omiten). Solo se leen las celdas entre la primera y la última
+        columna pedidas, así que la memoria no crece con el tamaño de la hoja.
+
+        Args:
+            heading_text (str): Texto que debe contener el encabezado. Por defecto, "CÓDIGO".
+            columnas (list): Columnas que se devuelven. Por defecto, EXCEL_COLUMNS.
+        """
+        if not self.excel_path or not os.path.exists(self.excel_path):
+            raise FileNotFoundError(f"No se encontró el archivo: {self.excel_path}")
+
+        patron = re.compile(heading_text)
+        wb = load_workbook(self.excel_path, read_only=True, data_only=True)
+        try:
+            ws = wb.worksheets[0]
+            # Buscar la fila que contiene el encabezado
+            for num_fila, fila in enumerate(ws.iter_rows(values_only=True), start=1):
+                if any(patron.search(str(v)) for v in fila if v is not None):
+                    break
+            else:
+                raise ValueError(f"No se encontró el encabezado '{heading_text}' en {self.excel_path}")
+
+            nombres = [None if v is None else str(v) for v in fila]
+            if heading_text not in nombres:
+                raise KeyError(heading_text)
+            # posición (1-based) de la primera aparición de cada columna pedida que exista
+            posiciones = {}
+            for col in (heading_text,) + tuple(c for c in (columnas or []) if c != heading_text):
+                if col in nombres:
+                    posiciones[col] = nombres.index(col) + 1
+            min_col = min(posiciones.values())
+            max_col = max(posiciones.values())
+            salida = [col for col in (columnas or [heading_text]) if col in posiciones]
+
+            for valores in ws.iter_rows(min_row=num_fila + 1, min_col=min_col, max_col=max_col, values_only=True):
+                if not valores or valores[posiciones[heading_text] - min_col] is None:
+                    continue
+                yield {col: valores[posiciones[col] - min_col] for col in salida}
+        finally:
+            wb.close()
+
+    def excel_to_json(self, heading_text="CÓDIGO", progreso=None):
         """
         Limpia un archivo de Excel, buscando un encabezado específico, eliminando filas innecesarias y guardando el resultado.
-        
+
         Args:
             heading_text (str): Texto que debe contener el encabezado. Por defecto, "CÓDIGO".
-        
+            progreso: Receptor de los eventos de la etapa ETAPA_EXCEL (ver progress.como_progreso).
+
         Returns:
             str: Ruta del archivo JSON generado.
         """
+        progreso = como_progreso(progreso)
+        progreso.inicio_etapa(ETAPA_EXCEL)
         try:
-            # Verificar que la ruta del Excel existe
-            if not self.excel_path or not os.path.exists(self.excel_path):
-                raise FileNotFoundError(f"No se encontró el archivo: {self.excel_path}")
-                
-            # Leer el archivo de Excel a un DataFrame
-            partidas = pd.read_excel(self.excel_path)
-            
-            # Buscar la fila que contiene el encabezado
-            header_row_index = partidas.apply(lambda row: row.astype(str).str.contains(heading_text).any(), axis=1).idxmax()
-            
-            # Cambiar el encabezado del DataFrame a la fila que contiene el valor del encabezado
-            partidas.columns = partidas.iloc[header_row_index]
-            
-            # Eliminar las filas anteriores al encabezado
-            partidas = partidas.iloc[header_row_index + 1:].reset_index(drop=True)
-            
-            # Eliminar las filas que contienen valores nulos en la columna del encabezado
-            partidas = partidas.dropna(subset=[heading_text])
-            
-            # Seleccionar las columnas que se desean conservar
-            if EXCEL_COLUMNS:
-                # Asegurarse de que solo se incluyan columnas que existen en el DataFrame
-                columns_to_keep = [col for col in EXCEL_COLUMNS if col in partidas.columns]
-                if columns_to_keep:
-                    partidas = partidas[columns_to_keep]
-            
-            # Ordenar el DataFrame por la columna del encabezado en orden alfabético
-            partidas = partidas.sort_values(by=heading_text)
-            
+            # Seleccionar las columnas que se desean conservar, ordenadas por la columna del encabezado
+            t0 = time.perf_counter()
+            partidas = self.cargar_partidas(heading_text, progreso=progreso).to_dataframe(EXCEL_COLUMNS)
+            t1 = time.perf_counter()
+
             # Crear el directorio de salida si no existe
             output_dir = os.path.dirname(EXCEL_OUTPUT_PATH)
             if output_dir and not os.path.exists(output_dir):
                 os.makedirs(output_dir)
-                
+
             # Guardar como archivo JSON en la ruta de salida
             partidas.to_json(EXCEL_OUTPUT_PATH, orient="records", force_ascii=False)
-            print(f"Archivo JSON guardado en {EXCEL_OUTPUT_PATH}")
-            
+            progreso.fin_etapa(
+                ETAPA_EXCEL, os.path.getsize(EXCEL_OUTPUT_PATH),
+                {"parse": t1 - t0, "save": time.perf_counter() - t1},
+                f"Archivo JSON guardado en {EXCEL_OUTPUT_PATH}",
+            )
+
             return EXCEL_OUTPUT_PATH
-            
+
         except Exception as e:
             error_msg = f"Error al procesar el Excel: {str(e)}"
-            print(error_msg)
+            progreso.fin_etapa(ETAPA_EXCEL, mensaje=error_msg)
             raise Exception(error_msg)
 
-    def excel_to_list(self, heading_text="CÓDIGO", columns_to_keep="CÓDIGO"):
+    def excel_to_list(self, heading_text="CÓDIGO", columns_to_keep="CÓDIGO", streaming=None, progreso=None):
         """
-        Limpia un archivo de Excel, buscando un encabezado específico, eliminando filas innecesarias 
+        Limpia un archivo de Excel, buscando un encabezado específico, eliminando filas innecesarias
         y crea una objeto list con los codigos que parecen en el archivo.
 
         Args:
-            entry_file (str): Ruta al archivo de Excel de entrada.
             heading_text (str): Texto que debe contener el encabezado. Por defecto, "CÓDIGO".
-            columns_to_keep (list): Lista de nombres de columnas a conservar. Por defecto, "CÓDIGO".
+            columns_to_keep (str): Columna cuyos valores se devuelven. Por defecto, "CÓDIGO".
+            streaming (bool): Si es True se lee con iter_partidas sin cargar la hoja en pandas,
+                para libros muy grandes. El resultado es el mismo. Con None (por defecto) se
+                decide por el tamaño del fichero (ver config.EXCEL_STREAMING_MIN_BYTES).
+            progreso: Receptor de los eventos de la etapa ETAPA_EXCEL (ver progress.como_progreso).
 
         Returns:
             list: Lista de los codigos ordenadas alfabeticamente.
         """
-
+        progreso = como_progreso(progreso)
+        progreso.inicio_etapa(ETAPA_EXCEL)
         try:
-            # Leer el archivo de Excel a un DataFrame
-            partidas = pd.read_excel(self.excel_path)
-
-            # Buscar la fila que contiene el encabezado
-            header_row_index = partidas.apply(lambda row: row.astype(str).str.contains(heading_text).any(), axis=1).idxmax()
-
-            # Cambiar el encabezado del DataFrame a la fila que contiene el valor del encabezado
-            partidas.columns = partidas.iloc[header_row_index]
-
-            # Eliminar las filas anteriores al encabezado
-            partidas = partidas.iloc[header_row_index + 1:].reset_index(drop=True)
-
-            # Eliminar las filas que contienen valores nulos en la columna del encabezado
-            partidas = partidas.dropna(subset=[heading_text])
-
-            # Seleccionar las columnas que se desean conservar
-            if columns_to_keep:
-                partidas = partidas[columns_to_keep]
-
-            # Ordenar el DataFrame por la columna del encabezado en orden alfabético
-            partidas = partidas.sort_values()
-
+            t0 = time.perf_counter()
             # Crear un objeto list con todos los valores de la columna, tiene que haber 512 filas
-            codigos = partidas.tolist()
+            if streaming is None:
+                streaming = os.path.getsize(self.excel_path) >= EXCEL_STREAMING_MIN_BYTES
+            if streaming:
+                columna = columns_to_keep or heading_text
+                codigos = sorted(fila[columna] for fila in self.iter_partidas(heading_text, [columna]))
+            else:
+                columnas = self._columnas_necesarias(heading_text, columns_to_keep)
+                codigos = self.cargar_partidas(heading_text, columnas, progreso).to_list(columns_to_keep)
 
-            print(f"Lista creada correctamente")
+            progreso.fin_etapa(ETAPA_EXCEL, tiempos={"parse": time.perf_counter() - t0}, mensaje="Lista creada correctamente")
             return codigos
 
         except FileNotFoundError:
-            print(f"Error: No se encontró el archivo {self.excel_path}")
+            # cerrar la etapa aunque falle, para que la GUI y el registro no la den por abierta
+            progreso.fin_etapa(ETAPA_EXCEL, mensaje=f"Error: No se encontró el archivo {self.excel_path}")
         except Exception as e:
-            print(f"Ocurrió un error: {e}")
\ No newline at end of file
+            progreso.fin_etapa(ETAPA_EXCEL, mensaje=f"Ocurrió un error: {e}")
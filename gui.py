@@ -1,7 +1,23 @@
 import tkinter as tk
+import multiprocessing
+import queue
+import threading
 from tkinter import filedialog, messagebox, ttk
 import os
 from main import procesar
+from progress import (
+    ETAPA_DIVISION, ETAPA_EXCEL, ETAPA_FUSION, AvanceSeccion, ImpresorConsola, InicioEtapa,
+    ProcesoCancelado, Progreso,
+)
+
+# Cada cuántos milisegundos se revisa la cola de mensajes del proceso en segundo plano
+INTERVALO_COLA_MS = 100
+# Texto de la barra de estado para cada etapa
+NOMBRES_ETAPAS = {
+    ETAPA_EXCEL: "Leyendo Excel",
+    ETAPA_DIVISION: "Guardando sección",
+    ETAPA_FUSION: "Concatenando sección",
+}
 
 class ProcesadorApp:
     def __init__(self, root):
@@ -13,6 +29,8 @@ class ProcesadorApp:
         self.word_path = ""
         self.word_dir_origen = ""  # Carpeta de origen para procesar Excel
         self.word_dir_destino = ""  # Carpeta de destino para procesar Word
+        self.cola = queue.Queue()  # mensajes del hilo de trabajo hacia la interfaz
+        self.cancelar = None  # threading.Event del proceso en curso
             
         # Frame principal
         main_frame = ttk.Frame(root, padding="10")
@@ -64,6 +82,14 @@ class ProcesadorApp:
         self.process_excel_btn = ttk.Button(main_frame, text="Procesar Excel", command=self.procesar_excel)
         self.process_excel_btn.pack(pady=7)
 
+        # Barra de progreso y botón para cancelar el proceso en curso
+        progreso_frame = ttk.Frame(main_frame)
+        progreso_frame.pack(fill=tk.X, padx=10, pady=5)
+        self.progressbar = ttk.Progressbar(progreso_frame, mode="determinate")
+        self.progressbar.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        self.cancel_btn = ttk.Button(progreso_frame, text="Cancelar", command=self.cancelar_proceso, state="disabled")
+        self.cancel_btn.pack(side=tk.RIGHT, padx=5)
+
         # Barra de estado
         self.status_label = ttk.Label(main_frame, text="Listo para seleccionar archivos", relief=tk.SUNKEN)
         self.status_label.pack(fill=tk.X, pady=5)
@@ -116,15 +142,14 @@ class ProcesadorApp:
         if not origen:
             messagebox.showwarning("Advertencia", "Debes escribir la ruta de la carpeta de origen de los Word")
             return
-        try:
-            self.status_label.config(text="Procesando Excel...")
-            self.root.update()
-            salida = procesar(self.excel_path, self.word_path, origen)
-            messagebox.showinfo("¡Listo!", f"Excel procesado: {salida}")
-            self.status_label.config(text="Procesamiento de Excel completado")
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
-            self.status_label.config(text="Error al procesar Excel")
+        self.lanzar_proceso(
+            lambda progreso, cancelar: procesar(
+                self.excel_path, self.word_path, origen, progreso=progreso, cancelar=cancelar
+            ),
+            inicio="Procesando Excel...",
+            ok=lambda salida: (f"Excel procesado: {salida}", "Procesamiento de Excel completado"),
+            error="Error al procesar Excel",
+        )
 
     def procesar_word(self):
         if not self.word_path:
@@ -134,16 +159,85 @@ class ProcesadorApp:
         if not destino:
             messagebox.showwarning("Advertencia", "Debes escribir la ruta de la carpeta de destino de los Word generados")
             return
+        from main import procesar_word
+        self.lanzar_proceso(
+            lambda progreso, cancelar: procesar_word(
+                self.word_path, destino, n_workers=None, progreso=progreso, cancelar=cancelar
+            ),
+            inicio="Procesando Word...",
+            ok=lambda salida: (f"Word procesado. Secciones guardadas en: {salida}", "Procesamiento de Word completado"),
+            error="Error al procesar Word",
+        )
+
+    def lanzar_proceso(self, tarea, inicio, ok, error):
+        """
+        Ejecuta tarea(progreso, cancelar) en un hilo aparte para no bloquear la ventana.
+        El hilo solo escribe en self.cola; la interfaz se actualiza desde revisar_cola.
+        """
+        self.cancelar = threading.Event()
+        self.set_procesando(True)
+        self.progressbar.config(value=0, maximum=1)
+        self.status_label.config(text=inicio)
+
+        def a_cola(evento):
+            if isinstance(evento, AvanceSeccion):
+                texto = f"{NOMBRES_ETAPAS.get(evento.etapa, evento.etapa)}: {evento.codigo}"
+                self.cola.put(("progreso", evento.hecho, evento.total, texto))
+            elif isinstance(evento, InicioEtapa):
+                self.cola.put(("progreso", 0, evento.total or 1, NOMBRES_ETAPAS.get(evento.etapa, evento.etapa)))
+
+        # la consola sigue mostrando los mensajes de siempre; la ventana recibe los eventos por la cola
+        progreso = Progreso(ImpresorConsola(), a_cola)
+
+        def trabajo(cancelar):
+            try:
+                self.cola.put(("fin", tarea(progreso, cancelar)))
+            except ProcesoCancelado:
+                self.cola.put(("cancelado",))
+            except Exception as e:
+                self.cola.put(("error", e))
+
+        threading.Thread(target=trabajo, args=(self.cancelar,), daemon=True).start()
+        self.root.after(INTERVALO_COLA_MS, self.revisar_cola, ok, error)
+
+    def revisar_cola(self, ok, error):
+        terminado = False
         try:
-            self.status_label.config(text="Procesando Word...")
-            self.root.update()
-            from main import procesar_word
-            salida = procesar_word(self.word_path, destino)
-            messagebox.showinfo("¡Listo!", f"Word procesado. Secciones guardadas en: {salida}")
-            self.status_label.config(text="Procesamiento de Word completado")
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
-            self.status_label.config(text="Error al procesar Word")
+            while True:
+                mensaje = self.cola.get_nowait()
+                if mensaje[0] == "progreso":
+                    _, hecho, total, texto = mensaje
+                    self.progressbar.config(value=hecho, maximum=max(total, 1))
+                    self.status_label.config(text=f"{texto} ({hecho}/{total})")
+                    continue
+                terminado = True
+                self.set_procesando(False)
+                if mensaje[0] == "fin":
+                    aviso, estado = ok(mensaje[1])
+                    messagebox.showinfo("¡Listo!", aviso)
+                    self.status_label.config(text=estado)
+                elif mensaje[0] == "cancelado":
+                    self.status_label.config(text="Proceso cancelado")
+                else:
+                    messagebox.showerror("Error", str(mensaje[1]))
+                    self.status_label.config(text=error)
+                break
+        except queue.Empty:
+            pass
+        if not terminado:
+            self.root.after(INTERVALO_COLA_MS, self.revisar_cola, ok, error)
+
+    def cancelar_proceso(self):
+        if self.cancelar is not None:
+            self.cancelar.set()
+            self.cancel_btn.config(state="disabled")
+            self.status_label.config(text="Cancelando al terminar la sección actual...")
+
+    def set_procesando(self, procesando):
+        estado = "disabled" if procesando else "normal"
+        self.process_word_btn.config(state=estado)
+        self.process_excel_btn.config(state=estado)
+        self.cancel_btn.config(state="normal" if procesando else "disabled")
 
 def main():
     root = tk.Tk()
@@ -151,4 +245,6 @@ def main():
     root.mainloop()
 
 if __name__ == "__main__":
+    # Necesario para que el pool de procesos del divisor funcione en el ejecutable congelado
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
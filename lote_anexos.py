@@ -0,0 +1,280 @@
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from config import MOTOR_DIRECTO, RESULT_CACHE_DIR, RESULT_CACHE_MAX_BYTES
+from excel_factory import ExcelFactory
+from progress import ETAPA_LOTE, FinEtapa, ProcesoCancelado, Progreso, comprobar_cancelacion, como_progreso
+from result_cache import ResultCache
+from test3 import Test3Factory, crear_cache_secciones, ruta_codigos_no_añadidos
+
+# Informe del lote, dentro de la carpeta de salida
+INFORME_LOTE = "informe_lote.json"
+# Códigos no añadidos que se muestran por anexo en el resumen de consola (el resto, en el informe)
+CODIGOS_EN_RESUMEN = 10
+
+# Contenido de las secciones compartidas y caché de secciones cargadas, en cada proceso
+# del pool (ver _iniciar_worker)
+_secciones_worker = {}
+_cache_worker = None
+
+
+def _iniciar_worker(secciones, cache_secciones=None):
+    global _secciones_worker, _cache_worker
+    _secciones_worker = secciones
+    _cache_worker = crear_cache_secciones(cache_secciones)
+
+
+def _generar_anexo(trabajo, section_cache=None, document_cache=None):
+    """
+    Genera en el proceso actual un anexo del lote (un diccionario preparado por procesar_lote).
+    Las secciones se abren desde section_cache y document_cache o, en los procesos del pool,
+    desde las recibidas al iniciar el proceso.
+    Devuelve (nombre, bytes escritos, tiempos de la fusión, contadores de la fusión).
+    """
+    factory = Test3Factory(
+        trabajo["original"], trabajo["origen"], trabajo["codigos"], trabajo["salida"],
+        section_cache=_secciones_worker if section_cache is None else section_cache,
+        missing_codes_path=trabajo["fichero_no_añadidos"],
+        document_cache=_cache_worker if document_cache is None else document_cache,
+    )
+    tiempos = {}
+    contadores = {}
+
+    def registrar(evento):
+        if isinstance(evento, FinEtapa):
+            tiempos.update(evento.tiempos)
+            contadores.update(evento.contadores)
+
+    factory.merge_sections(
+        trabajo["motor"], trabajo["prefetch"], trabajo["n_workers_carga"],
+        secciones=trabajo["secciones"], codigos_no_añadidos=trabajo["codigos_no_añadidos"],
+        progreso=Progreso(registrar),
+    )
+    return trabajo["nombre"], os.path.getsize(trabajo["salida"]), tiempos, contadores
+
+
+def leer_secciones(rutas):
+    """
+    Lee una sola vez el contenido de cada ruta. Devuelve un diccionario ruta -> bytes.
+    """
+    secciones = {}
+    for ruta in rutas:
+        with open(ruta, "rb") as f:
+            secciones[ruta] = f.read()
+    return secciones
+
+
+def resumen_lote(informe):
+    """
+    Texto de fin de lote: anexos generados y códigos no añadidos de cada uno.
+    """
+    generados = [d for d in informe.values() if not d.get("error")]
+    desde_cache = sum(1 for d in generados if d.get("cache"))
+    lineas = [
+        f"Anexos generados: {len(generados)} de {len(informe)} "
+        f"({desde_cache} desde la caché, {len(informe) - len(generados)} con error)."
+    ]
+    for nombre, datos in informe.items():
+        if datos.get("error"):
+            lineas.append(f"  {nombre}: ERROR {datos['error']}")
+            continue
+        faltan = datos["codigos_no_añadidos"]
+        if not faltan:
+            lineas.append(f"  {nombre}: todos los códigos añadidos")
+            continue
+        muestra = ", ".join(faltan[:CODIGOS_EN_RESUMEN]) + (", ..." if len(faltan) > CODIGOS_EN_RESUMEN else "")
+        lineas.append(f"  {nombre}: {len(faltan)} códigos no añadidos ({muestra}) -> {datos['fichero_no_añadidos']}")
+    return "\n".join(lineas)
+
+
+def procesar_lote(
+    excel_paths, origen, output_dir, original_docx="ficheros/original.docx", n_workers=None,
+    motor=MOTOR_DIRECTO, cache_dir=RESULT_CACHE_DIR, prefetch=4, n_workers_carga=2,
+    progreso=None, cancelar=None, cache_secciones=None, excel_streaming=None,
+):
+    """
+    Genera un anexo por cada Excel de excel_paths a partir de la misma carpeta de secciones.
+
+    Los Excel se leen y sus códigos se resuelven en este proceso, con un único índice de la
+    carpeta origen. Después cada sección necesaria (y original_docx) se lee una sola vez del
+    disco y su contenido se comparte con todos los anexos, que se fusionan en paralelo en un
+    pool de n_workers procesos (None = todos los núcleos, 1 = en este proceso). Cada proceso
+    recibe una copia del contenido, así que la memoria crece con el tamaño de las secciones
+    usadas por el número de procesos.
+
+    Cada anexo se guarda como <output_dir>/<nombre del Excel>.docx, con sus códigos no
+    añadidos en <nombre del Excel>_codigos_no_añadidos.txt. Un anexo que falla no detiene
+    a los demás: el error queda en el informe.
+
+    Args:
+        excel_paths (list): Excel con los códigos de cada anexo
+        origen (str): Carpeta con las secciones Word
+        output_dir (str): Carpeta donde se guardan los anexos y el informe
+        original_docx (str): Documento sobre el que se concatenan las secciones
+        n_workers (int): Procesos que generan anexos a la vez
+        motor (str): Motor de fusión (ver test3.MOTORES)
+        cache_dir (str): Carpeta de la caché de anexos generados (None para no usarla)
+        prefetch (int): Secciones que cada anexo carga por adelantado durante la fusión
+        n_workers_carga (int): Hilos que cargan esas secciones
+        progreso (Progreso | callable): Recibe los eventos de la etapa Excel de cada libro y
+            los de ETAPA_LOTE, con un avance por anexo terminado
+        cancelar (threading.Event): Si se activa, no se empiezan más anexos
+        cache_secciones (int): Entradas de la caché de secciones cargadas de cada proceso
+            (None = la de config, desactivada por defecto; ver document_cache.DocumentCache)
+        excel_streaming (bool): Leer los Excel en streaming con openpyxl
+            (None = según su tamaño; ver ExcelFactory.excel_to_list)
+
+    Returns:
+        dict: Informe por anexo (también guardado en <output_dir>/informe_lote.json): excel, salida,
+            secciones, codigos_no_añadidos, fichero_no_añadidos, cache, bytes, tiempos, contadores
+            (aciertos y fallos de la caché de secciones) y error
+    """
+    progreso = como_progreso(progreso)
+    os.makedirs(output_dir, exist_ok=True)
+
+    nombres = [os.path.splitext(os.path.basename(p))[0] for p in excel_paths]
+    repetidos = sorted({n for n in nombres if nombres.count(n) > 1})
+    if repetidos:
+        raise ValueError(f"Varios Excel generarían el mismo anexo: {repetidos}")
+
+    cache = ResultCache(cache_dir, RESULT_CACHE_MAX_BYTES) if cache_dir else None
+    resolvedor = Test3Factory(original_docx, origen, [], None)
+    informe = {}
+    trabajos = []
+    claves = {}
+    for nombre, excel_path in zip(nombres, excel_paths):
+        comprobar_cancelacion(cancelar)
+        salida = os.path.join(output_dir, f"{nombre}.docx")
+        datos = informe[nombre] = {
+            "excel": excel_path,
+            "salida": salida,
+            "secciones": 0,
+            "codigos_no_añadidos": [],
+            "fichero_no_añadidos": ruta_codigos_no_añadidos(salida),
+            "cache": False,
+            "bytes": 0,
+            "tiempos": {},
+            "contadores": {},
+            "error": None,
+        }
+        codigos = ExcelFactory(excel_path).excel_to_list(streaming=excel_streaming, progreso=progreso)
+        if codigos is None:
+            datos["error"] = "no se pudo leer el Excel"
+            continue
+
+        resolvedor.id_list = codigos
+        secciones, codigos_no_añadidos = resolvedor.resolve_sections(progreso)
+        datos["secciones"] = len(secciones)
+        datos["codigos_no_añadidos"] = codigos_no_añadidos
+        if cache is not None:
+            claves[nombre] = cache.make_key(
+                codigos, [path for _, path, _ in secciones], original_docx, motor
+            )
+            if cache.get(claves[nombre], salida):
+                resolvedor.missing_codes_path = datos["fichero_no_añadidos"]
+                resolvedor.write_missing_codes(codigos_no_añadidos, progreso)
+                datos["cache"] = True
+                datos["bytes"] = os.path.getsize(salida)
+                continue
+        trabajos.append({
+            "nombre": nombre,
+            "origen": origen,
+            "original": original_docx,
+            "codigos": codigos,
+            "salida": salida,
+            "secciones": secciones,
+            "codigos_no_añadidos": codigos_no_añadidos,
+            "fichero_no_añadidos": datos["fichero_no_añadidos"],
+            "motor": motor,
+            "prefetch": prefetch,
+            "n_workers_carga": n_workers_carga,
+        })
+
+    rutas = {original_docx}
+    for trabajo in trabajos:
+        rutas.update(path for _, path, _ in trabajo["secciones"])
+    compartidas = leer_secciones(sorted(rutas)) if trabajos else {}
+    progreso.mensaje(
+        ETAPA_LOTE,
+        f"Anexos a generar: {len(trabajos)} de {len(informe)}. Secciones distintas: {len(rutas) - 1} "
+        f"({sum(len(c) for c in compartidas.values()) / 1e6:.1f} MB compartidos).",
+    )
+
+    total = len(informe)
+    hechos = 0
+    bytes_escritos = 0
+    acumulados = {}
+    contadores = {}
+    progreso.inicio_etapa(ETAPA_LOTE, total)
+
+    def registrar(nombre, bytes_anexo=0, tiempos=None, contadores_anexo=None, error=None):
+        nonlocal hechos, bytes_escritos
+        datos = informe[nombre]
+        hechos += 1
+        if error is not None:
+            datos["error"] = error
+            progreso.aviso(ETAPA_LOTE, f"Error al generar el anexo '{nombre}': {error}")
+        else:
+            datos["bytes"] = bytes_anexo
+            datos["tiempos"] = tiempos or {}
+            datos["contadores"] = contadores_anexo or {}
+            bytes_escritos += bytes_anexo
+            for fase, segundos in datos["tiempos"].items():
+                acumulados[fase] = acumulados.get(fase, 0.0) + segundos
+            for contador, valor in datos["contadores"].items():
+                contadores[contador] = contadores.get(contador, 0) + valor
+            if cache is not None and not datos["cache"]:
+                cache.put(claves[nombre], datos["salida"], progreso, ETAPA_LOTE)
+        progreso.seccion(ETAPA_LOTE, hechos, total, nombre, datos["salida"], datos["bytes"], datos["tiempos"])
+
+    # los anexos de la caché o con el Excel ilegible ya están terminados
+    for nombre, datos in informe.items():
+        if datos["cache"] or datos["error"]:
+            registrar(nombre, datos["bytes"], error=datos["error"])
+
+    if n_workers is None:
+        n_workers = os.cpu_count() or 1
+    n_workers = max(1, min(n_workers, len(trabajos)))
+    if n_workers == 1:
+        cache_documentos = crear_cache_secciones(cache_secciones)
+        for trabajo in trabajos:
+            comprobar_cancelacion(cancelar)
+            t0 = time.perf_counter()
+            try:
+                resultado = _generar_anexo(trabajo, compartidas, cache_documentos)
+            except ProcesoCancelado:
+                raise
+            except Exception as e:
+                registrar(trabajo["nombre"], error=str(e))
+                continue
+            registrar(*resultado)
+            progreso.mensaje(ETAPA_LOTE, f"  '{trabajo['nombre']}' generado en {time.perf_counter() - t0:.1f}s")
+    elif trabajos:
+        progreso.mensaje(ETAPA_LOTE, f"Generando {len(trabajos)} anexos con {n_workers} procesos.")
+        with ProcessPoolExecutor(
+            max_workers=n_workers, initializer=_iniciar_worker, initargs=(compartidas, cache_secciones)
+        ) as pool:
+            futuros = {pool.submit(_generar_anexo, trabajo): trabajo["nombre"] for trabajo in trabajos}
+            try:
+                for futuro in as_completed(futuros):
+                    try:
+                        resultado = futuro.result()
+                    except Exception as e:
+                        registrar(futuros[futuro], error=str(e))
+                    else:
+                        registrar(*resultado)
+                    comprobar_cancelacion(cancelar)
+            except BaseException:
+                pool.shutdown(wait=True, cancel_futures=True)
+                raise
+
+    informe_path = os.path.join(output_dir, INFORME_LOTE)
+    with open(informe_path, "w", encoding="utf-8") as f:
+        json.dump(informe, f, ensure_ascii=False, indent=2)
+    progreso.fin_etapa(
+        ETAPA_LOTE, bytes_escritos, acumulados,
+        f"{resumen_lote(informe)}\nInforme del lote guardado en: {informe_path}",
+        contadores=contadores,
+    )
+    return informe
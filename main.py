@@ -1,11 +1,23 @@
+import argparse
 import os
-from config import EXCEL_OUTPUT_PATH
-from excel_factory import ExcelFactory
-from test3 import Test3Factory
-from word_factory import WordFactory
-from test2 import split_doc_by_heading3_parallel
+import sys
+from config import MOTOR_COMPOSER, MOTOR_DIRECTO, MOTOR_STREAMING, RESULT_CACHE_DIR, RESULT_CACHE_MAX_BYTES
+from result_cache import ResultCache
+from progress import ETAPA_FUSION, ImpresorConsola, ProcesoCancelado, Progreso, RegistroJsonl, como_progreso
 
-def procesar(excel_path, word_path, origen):
+# pandas, python-docx y docxcompose se importan dentro de cada función que los usa,
+# para que la línea de comandos (--help, split) arranque sin cargarlos todos.
+
+ORIGINAL_DOCX = "ficheros/original.docx"
+OUTPUT_DOCX = "ficheros/output.docx"
+LOTE_DIR = "ficheros/anexos"
+
+
+def procesar(
+    excel_path, word_path, origen, cache_dir=RESULT_CACHE_DIR, progreso=None, cancelar=None,
+    original_docx=ORIGINAL_DOCX, output_docx=OUTPUT_DOCX, prefetch=4, n_workers_carga=2, motor=MOTOR_DIRECTO,
+    missing_codes_path=None, cache_secciones=None, excel_streaming=None,
+):
     """
     Procesa un archivo Excel seleccionado y genera un archivo JSON.
     
@@ -13,54 +25,274 @@ def procesar(excel_path, word_path, origen):
         excel_path (str): Ruta al archivo Excel a procesar
         word_path (str): Ruta al archivo Word a procesar 
         origen (str): Carpeta de origen para los archivos Word
+        cache_dir (str): Carpeta de la caché de anexos generados (None para no usarla)
+        progreso (Progreso | callable): Receptor de los eventos de las etapas Excel y fusión
+            (ver progress.como_progreso); un callable recibe (hecho, total, código) por sección
+        cancelar (threading.Event): Si se activa, el proceso se detiene entre dos secciones
+        original_docx (str): Documento sobre el que se concatenan las secciones
+        output_docx (str): Ruta del anexo generado
+        prefetch (int): Secciones que se cargan por adelantado durante la fusión
+        n_workers_carga (int): Hilos que cargan esas secciones
+        motor (str): Motor de fusión, MOTOR_DIRECTO, MOTOR_STREAMING o MOTOR_COMPOSER
+        missing_codes_path (str): Fichero de códigos no añadidos
+            (por defecto <output_docx sin extensión>_codigos_no_añadidos.txt)
+        cache_secciones (int): Entradas de la caché de secciones cargadas
+            (None = la de config, desactivada por defecto; ver document_cache.DocumentCache)
+        excel_streaming (bool): Leer el Excel en streaming con openpyxl
+            (None = según su tamaño; ver ExcelFactory.excel_to_list)
     
     Returns:
         str: Ruta del archivo JSON generado
     """
+    from excel_factory import ExcelFactory
+    from test3 import Test3Factory, crear_cache_secciones, crear_carpeta_salida
+
+    progreso = como_progreso(progreso)
     try:
+        # la carpeta del anexo se crea antes de leer el Excel, no al guardar tras toda la fusión
+        crear_carpeta_salida(output_docx)
         # Crear una instancia de ExcelFactory con la ruta del Excel
         excel_factory = ExcelFactory(excel_path)
         # Procesar el Excel y obtener la lista de códigos
-        code_list = excel_factory.excel_to_list()
+        code_list = excel_factory.excel_to_list(streaming=excel_streaming, progreso=progreso)
 
         # Usar los parámetros word_path y origen
         word_new_factory = Test3Factory(
-            original_docx="ficheros/original.docx",  # Documento original Word
+            original_docx=original_docx,  # Documento original Word
             sections_dir=origen,      # Carpeta de origen de los Word
             id_list=code_list,
-            output_docx="ficheros/output.docx"  # Guarda el resultado en la carpeta de origen
+            output_docx=output_docx,  # Ruta del anexo generado
+            missing_codes_path=missing_codes_path,
+            document_cache=crear_cache_secciones(cache_secciones),
         )
-        word_new_factory.merge_sections_with_composer()
-        res = f"Codigos no añadidos guardados en la carpeta '{origen}'"
+        secciones, codigos_no_añadidos = word_new_factory.resolve_sections(progreso)
+
+        # Si ya se generó un anexo con los mismos códigos, secciones, original y motor, se reutiliza
+        cache = ResultCache(cache_dir, RESULT_CACHE_MAX_BYTES) if cache_dir else None
+        clave = None
+        if cache is not None:
+            clave = cache.make_key(
+                code_list, [path for _, path, _ in secciones], word_new_factory.original_docx, motor
+            )
+        if cache is not None and cache.get(clave, word_new_factory.output_docx):
+            word_new_factory.write_missing_codes(codigos_no_añadidos, progreso)
+            progreso.inicio_etapa(ETAPA_FUSION, len(secciones))
+            progreso.fin_etapa(
+                ETAPA_FUSION, os.path.getsize(word_new_factory.output_docx),
+                mensaje=f"Anexo recuperado de la caché: {word_new_factory.output_docx}",
+            )
+        else:
+            word_new_factory.merge_sections(
+                motor=motor, prefetch=prefetch, n_workers=n_workers_carga,
+                secciones=secciones, codigos_no_añadidos=codigos_no_añadidos,
+                progreso=progreso, cancelar=cancelar,
+            )
+            if cache is not None:
+                cache.put(clave, word_new_factory.output_docx, progreso)
+        res = f"Codigos no añadidos guardados en: {word_new_factory.missing_codes_path}"
         return res
+    except ProcesoCancelado:
+        raise
     except Exception as e:
         raise Exception(f"Error al procesar el archivo: {str(e)}")
     
-def procesar_word(word_path, output_dir):
+def procesar_word(
+    word_path, output_dir, n_workers=1, progreso=None, cancelar=None, incremental=False,
+    debug_chunks=False, n_chunks=10,
+):
     """
     Procesa un archivo Word seleccionado y lo divide por Heading 3, guardando las secciones en la carpeta indicada.
     Args:
         word_path (str): Ruta al archivo Word a procesar
         output_dir (str): Carpeta de salida para las secciones
+        n_workers (int): Procesos que escriben secciones en paralelo (1 = secuencial, None = todos los núcleos)
+        progreso (Progreso | callable): Receptor de los eventos de la división
+            (ver progress.como_progreso); un callable recibe (hecho, total, código) por sección
+        cancelar (threading.Event): Si se activa, el proceso se detiene entre dos secciones
+        incremental (bool): Solo reescribe las secciones que han cambiado desde la última división
+        debug_chunks (bool): Escribe además los lotes de secciones en <output_dir>/chunks para depuración
+        n_chunks (int): Lotes en los que se reparten las secciones (entre procesos y en los chunks)
     Returns:
         str: Ruta de la carpeta de salida
     """
+    from test2 import split_doc_by_heading3_parallel
+
     try:
-        split_doc_by_heading3_parallel(word_path, output_dir)
+        split_doc_by_heading3_parallel(
+            word_path, output_dir, n_chunks=n_chunks, n_workers=n_workers, incremental=incremental,
+            debug_chunks=debug_chunks, progreso=progreso, cancelar=cancelar,
+        )
         return output_dir
+    except ProcesoCancelado:
+        raise
     except Exception as e:
         raise Exception(f"Error al procesar el archivo Word: {str(e)}")
     
-if __name__ == "__main__":
-    # Este código se ejecutará solo si se ejecuta este script directamente
-    import sys
-    
-    if len(sys.argv) > 1:
-        excel_path = sys.argv[1]
-        try:
-            resultado = procesar(excel_path)
-            print(f"Proceso completado. Archivo generado: {resultado}")
-        except Exception as e:
-            print(f"Error: {e}")
+
+
+def crear_parser():
+    """
+    Parser de la línea de comandos, con los subcomandos split, merge, build y lote.
+    """
+    comunes = argparse.ArgumentParser(add_help=False)
+    comunes.add_argument("--quiet", action="store_true", help="No mostrar el avance por consola")
+    comunes.add_argument("--log-jsonl", metavar="RUTA",
+                         help="Añade cada evento de avance como una línea JSON al fichero indicado")
+    comunes.add_argument("--profile", action="store_true", help="Mide cada etapa y sección y muestra un resumen")
+    comunes.add_argument("--pstats", metavar="RUTA", help="Con --profile, guarda también las estadísticas de cProfile")
+    comunes.add_argument("--speedscope", metavar="RUTA", help="Con --profile, guarda la línea de tiempo para speedscope")
+
+    division = argparse.ArgumentParser(add_help=False)
+    division.add_argument("--workers", type=int, default=None,
+                          help="Procesos que escriben secciones (1 = secuencial; por defecto, todos los núcleos)")
+    division.add_argument("--chunks", type=int, default=10,
+                          help="Lotes en los que se reparten las secciones entre procesos (por defecto 10)")
+    division.add_argument("--debug-chunks", action="store_true",
+                          help="Escribe también cada lote en <salida>/chunks/chunk_NN.docx para depuración")
+
+    fusion = argparse.ArgumentParser(add_help=False)
+    fusion.add_argument("--original", default=ORIGINAL_DOCX, help=f"Documento base del anexo (por defecto {ORIGINAL_DOCX})")
+    fusion.add_argument("--cache-dir", default=RESULT_CACHE_DIR, help="Carpeta de la caché de anexos generados")
+    fusion.add_argument("--no-cache", action="store_true", help="No usar la caché de anexos")
+    fusion.add_argument("--motor", choices=(MOTOR_DIRECTO, MOTOR_STREAMING, MOTOR_COMPOSER), default=MOTOR_DIRECTO,
+                        help="Motor de fusión: directo (rápido), streaming (memoria acotada, anexos muy grandes) "
+                             "o composer (docxcompose, compatibilidad)")
+    fusion.add_argument("--prefetch", type=int, default=4, help="Secciones cargadas por adelantado durante la fusión")
+    fusion.add_argument("--load-workers", type=int, default=2, help="Hilos que cargan esas secciones")
+    fusion.add_argument("--cache-secciones", type=int, metavar="N", default=None,
+                        help="Guarda en memoria hasta N secciones cargadas para reutilizarlas "
+                             "(útil si muchos códigos comparten sección; desactivada por defecto)")
+    fusion.add_argument("--excel-streaming", action=argparse.BooleanOptionalAction, default=None,
+                        help="Lee los códigos del Excel fila a fila con openpyxl, sin cargar la hoja "
+                             "(por defecto, solo en libros grandes)")
+
+    anexo = argparse.ArgumentParser(add_help=False)
+    anexo.add_argument("--output", default=OUTPUT_DOCX, help=f"Anexo generado (por defecto {OUTPUT_DOCX})")
+
+    parser = argparse.ArgumentParser(prog="main.py", description="Generador de anexos de infraestructura.")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+
+    split = subparsers.add_parser("split", parents=[comunes, division], help="Divide el Word maestro por Heading 3")
+    split.add_argument("word", help="Documento Word maestro")
+    split.add_argument("salida", help="Carpeta de salida (las secciones se guardan en <salida>/sections)")
+    split.add_argument("--incremental", action="store_true", help="Solo reescribe las secciones que han cambiado")
+
+    merge = subparsers.add_parser("merge", parents=[comunes, fusion, anexo], help="Genera el anexo a partir del Excel")
+    merge.add_argument("excel", help="Excel con los códigos de las partidas")
+    merge.add_argument("secciones", help="Carpeta con las secciones Word")
+
+    build = subparsers.add_parser("build", parents=[comunes, division, fusion, anexo], help="Divide el maestro y genera el anexo")
+    build.add_argument("word", help="Documento Word maestro")
+    build.add_argument("excel", help="Excel con los códigos de las partidas")
+    build.add_argument("--sections-dir", default="ficheros/secciones",
+                       help="Carpeta de salida de la división (por defecto ficheros/secciones)")
+    build.add_argument("--completo", action="store_true", help="Reescribe todas las secciones aunque no hayan cambiado")
+
+    lote = subparsers.add_parser("lote", parents=[comunes, fusion], help="Genera un anexo por cada Excel")
+    lote.add_argument("secciones", help="Carpeta con las secciones Word")
+    lote.add_argument("excels", nargs="+", help="Excel con los códigos de cada anexo")
+    lote.add_argument("--salida-dir", default=LOTE_DIR,
+                      help=f"Carpeta de los anexos, sus códigos no añadidos y el informe (por defecto {LOTE_DIR})")
+    lote.add_argument("--workers", type=int, default=None,
+                      help="Procesos que generan anexos a la vez (1 = secuencial; por defecto, todos los núcleos)")
+    return parser
+
+
+def ejecutar_comando(args, progreso):
+    """
+    Ejecuta el subcomando de args y devuelve el mensaje final.
+    """
+    if args.comando == "split":
+        salida = procesar_word(
+            args.word, args.salida, args.workers, progreso, incremental=args.incremental,
+            debug_chunks=args.debug_chunks, n_chunks=args.chunks,
+        )
+        return f"Secciones guardadas en: {os.path.join(salida, 'sections')}"
+
+    # con --profile se mide la fusión real, no la copia desde la caché
+    cache_dir = None if args.no_cache or args.profile else args.cache_dir
+    if args.comando == "lote":
+        from lote_anexos import INFORME_LOTE, procesar_lote
+
+        informe = procesar_lote(
+            args.excels, args.secciones, args.salida_dir, original_docx=args.original,
+            n_workers=args.workers, motor=args.motor, cache_dir=cache_dir,
+            prefetch=args.prefetch, n_workers_carga=args.load_workers, progreso=progreso,
+            cache_secciones=args.cache_secciones, excel_streaming=args.excel_streaming,
+        )
+        informe_path = os.path.join(args.salida_dir, INFORME_LOTE)
+        errores = [nombre for nombre, datos in informe.items() if datos["error"]]
+        if errores:
+            raise Exception(f"{len(errores)} anexos con error ({', '.join(errores)}); ver {informe_path}")
+        return f"Anexos guardados en: {args.salida_dir}"
+
+    if args.comando == "build":
+        procesar_word(
+            args.word, args.sections_dir, args.workers, progreso, incremental=not args.completo,
+            debug_chunks=args.debug_chunks, n_chunks=args.chunks,
+        )
+        secciones = os.path.join(args.sections_dir, "sections")
+        word_path = args.word
     else:
-        print("Uso: python main.py <ruta_al_excel>")
\ No newline at end of file
+        secciones = args.secciones
+        word_path = None
+    procesar(
+        args.excel, word_path, secciones, cache_dir=cache_dir, progreso=progreso,
+        original_docx=args.original, output_docx=args.output,
+        prefetch=args.prefetch, n_workers_carga=args.load_workers, motor=args.motor,
+        cache_secciones=args.cache_secciones, excel_streaming=args.excel_streaming,
+    )
+    return f"Anexo guardado en: {args.output}"
+
+
+def cli(argv=None):
+    """
+    Punto de entrada de la línea de comandos. Devuelve el código de salida del proceso.
+    """
+    args = crear_parser().parse_args(argv)
+    progreso = Progreso() if args.quiet else Progreso(ImpresorConsola())
+    perfilador = None
+    if args.profile:
+        from profiler import Perfilador
+
+        perfilador = Perfilador(cprofile=bool(args.pstats))
+        progreso.suscribir(perfilador)
+    registro = None
+    if args.log_jsonl:
+        registro = RegistroJsonl(args.log_jsonl)
+        progreso.suscribir(registro)
+
+    try:
+        if perfilador is not None:
+            with perfilador:
+                mensaje = ejecutar_comando(args, progreso)
+        else:
+            mensaje = ejecutar_comando(args, progreso)
+    except (ProcesoCancelado, KeyboardInterrupt):
+        print("Proceso cancelado")
+        return 130
+    except Exception as e:
+        print(f"Error: {e}")
+        return 1
+    finally:
+        if registro is not None:
+            registro.close()
+
+    if perfilador is not None:
+        print(perfilador.resumen())
+        if args.pstats:
+            perfilador.guardar_pstats(args.pstats)
+            print(f"Estadísticas de cProfile guardadas en: {args.pstats}")
+        if args.speedscope:
+            perfilador.guardar_speedscope(args.speedscope)
+            print(f"Perfil speedscope guardado en: {args.speedscope}")
+    print(f"Proceso completado. {mensaje}")
+    return 0
+
+
+if __name__ == "__main__":
+    # necesario para el pool de procesos de la división en ejecutables congelados
+    import multiprocessing
+
+    multiprocessing.freeze_support()
+    sys.exit(cli())
@@ -0,0 +1,154 @@
+import cProfile
+import json
+import time
+import tracemalloc
+from progress import AvanceSeccion, FinEtapa, InicioEtapa
+
+# Secciones más lentas que se listan en el resumen
+SECCIONES_LENTAS = 10
+
+
+class Perfilador:
+    """
+    Suscriptor de progress.Progreso que mide una ejecución completa: duración y memoria
+    de cada etapa y tiempos de cada sección. Con cprofile=True además perfila todas las
+    funciones con cProfile, para exportar a pstats.
+
+    La memoria se mide con tracemalloc, así que solo cuenta el proceso actual (no los
+    procesos del pool de división) y ralentiza algo la ejecución.
+    """
+
+    def __init__(self, cprofile=False):
+        self.etapas = []
+        self.secciones = []
+        self._abiertas = {}
+        self._inicio = None
+        self._perfil = cProfile.Profile() if cprofile else None
+
+    def __enter__(self):
+        tracemalloc.start()
+        self._inicio = time.time()
+        if self._perfil is not None:
+            self._perfil.enable()
+        return self
+
+    def __exit__(self, *exc):
+        if self._perfil is not None:
+            self._perfil.disable()
+        tracemalloc.stop()
+        return False
+
+    def __call__(self, evento):
+        actual, pico = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (0, 0)
+        if isinstance(evento, InicioEtapa):
+            if tracemalloc.is_tracing():
+                tracemalloc.reset_peak()
+            self._abiertas[evento.etapa] = (evento.instante, actual)
+        elif isinstance(evento, AvanceSeccion):
+            self.secciones.append({
+                "etapa": evento.etapa,
+                "codigo": evento.codigo,
+                "fin": evento.instante,
+                "bytes": evento.bytes_escritos,
+                "tiempos": dict(evento.tiempos),
+                "memoria": actual,
+            })
+        elif isinstance(evento, FinEtapa):
+            inicio, memoria_inicial = self._abiertas.pop(evento.etapa, (evento.instante - evento.segundos, 0))
+            self.etapas.append({
+                "etapa": evento.etapa,
+                "inicio": inicio,
+                "fin": evento.instante,
+                "segundos": evento.segundos,
+                "bytes": evento.bytes_escritos,
+                "tiempos": dict(evento.tiempos),
+                "contadores": dict(evento.contadores),
+                "memoria_inicial": memoria_inicial,
+                "memoria_pico": pico,
+            })
+
+    def resumen(self):
+        """
+        Devuelve una tabla de texto con cada etapa (duración, fases, secciones, bytes y
+        memoria), los contadores de las etapas que los tengan y las secciones más lentas.
+        """
+        lineas = [
+            f"{'Etapa':<10} {'Segundos':>9} {'Secciones':>9} {'MB escritos':>11} {'MB pico':>8}  Fases",
+        ]
+        for etapa in self.etapas:
+            n = sum(1 for s in self.secciones if s["etapa"] == etapa["etapa"])
+            fases = ", ".join(f"{fase} {seg:.3f}s" for fase, seg in etapa["tiempos"].items())
+            lineas.append(
+                f"{etapa['etapa']:<10} {etapa['segundos']:>9.3f} {n:>9} "
+                f"{etapa['bytes'] / 1e6:>11.2f} {etapa['memoria_pico'] / 1e6:>8.1f}  {fases}"
+            )
+
+        for etapa in self.etapas:
+            if etapa["contadores"]:
+                contadores = ", ".join(f"{nombre} {valor}" for nombre, valor in etapa["contadores"].items())
+                lineas.append(f"{etapa['etapa']:<10} {contadores}")
+
+        lentas = sorted(self.secciones, key=lambda s: sum(s["tiempos"].values()), reverse=True)
+        if lentas:
+            lineas.append("")
+            lineas.append(f"Secciones más lentas ({min(SECCIONES_LENTAS, len(lentas))} de {len(lentas)}):")
+            for s in lentas[:SECCIONES_LENTAS]:
+                fases = ", ".join(f"{fase} {seg:.3f}s" for fase, seg in s["tiempos"].items())
+                lineas.append(f"  {s['etapa']:<10} {s['codigo']:<20} {sum(s['tiempos'].values()):>8.3f}s  {fases}")
+        return "\n".join(lineas)
+
+    def guardar_pstats(self, path):
+        """
+        Guarda las estadísticas de cProfile (abrir con pstats o snakeviz). Requiere cprofile=True.
+        """
+        if self._perfil is None:
+            raise ValueError("El perfilador se creó sin cprofile=True")
+        self._perfil.dump_stats(path)
+
+    def guardar_speedscope(self, path, nombre="Generador de anexos"):
+        """
+        Guarda la línea de tiempo de etapas y secciones en formato speedscope (https://speedscope.app),
+        como perfil de eventos: cada etapa contiene sus secciones, una detrás de otra, y cada
+        sección dura desde el fin de la anterior hasta el suyo.
+        """
+        frames = []
+        indices = {}
+
+        def frame(nombre_frame):
+            if nombre_frame not in indices:
+                indices[nombre_frame] = len(frames)
+                frames.append({"name": nombre_frame})
+            return indices[nombre_frame]
+
+        origen = self._inicio or min((e["inicio"] for e in self.etapas), default=0.0)
+        eventos = []
+        for etapa in sorted(self.etapas, key=lambda e: e["inicio"]):
+            f_etapa = frame(etapa["etapa"])
+            eventos.append({"type": "O", "frame": f_etapa, "at": etapa["inicio"] - origen})
+            anterior = etapa["inicio"]
+            for s in self.secciones:
+                if s["etapa"] != etapa["etapa"] or not etapa["inicio"] <= s["fin"] <= etapa["fin"]:
+                    continue
+                f_seccion = frame(f"{etapa['etapa']}:{s['codigo']}")
+                eventos.append({"type": "O", "frame": f_seccion, "at": anterior - origen})
+                eventos.append({"type": "C", "frame": f_seccion, "at": s["fin"] - origen})
+                anterior = s["fin"]
+            eventos.append({"type": "C", "frame": f_etapa, "at": etapa["fin"] - origen})
+
+        fin = max((e["at"] for e in eventos), default=0.0)
+        datos = {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": frames},
+            "profiles": [{
+                "type": "evented",
+                "name": nombre,
+                "unit": "seconds",
+                "startValue": 0.0,
+                "endValue": fin,
+                "events": eventos,
+            }],
+            "name": nombre,
+            "exporter": "Generador-Anexos-Infraestructura",
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(datos, f, ensure_ascii=False)
@@ -0,0 +1,212 @@
+import json
+import time
+import threading
+
+# Nombres de las etapas que emiten eventos
+ETAPA_EXCEL = "excel"
+ETAPA_DIVISION = "division"
+ETAPA_FUSION = "fusion"
+# Generación de varios anexos (main lote): un avance por anexo terminado
+ETAPA_LOTE = "lote"
+
+# Niveles de los mensajes de una etapa
+NIVEL_INFO = "info"
+NIVEL_AVISO = "aviso"
+
+
+class ProcesoCancelado(Exception):
+    """
+    Se lanza cuando el usuario cancela un proceso; se comprueba entre dos secciones,
+    de modo que nunca queda un fichero de sección a medio escribir.
+    """
+
+
+def comprobar_cancelacion(cancelar):
+    """
+    Lanza ProcesoCancelado si cancelar (un threading.Event o similar) está activado.
+    """
+    if cancelar is not None and cancelar.is_set():
+        raise ProcesoCancelado("Proceso cancelado por el usuario")
+
+
+class Evento:
+    """
+    Base de los eventos de progreso. Cada subclase define tipo y sus propios campos.
+    """
+
+    tipo = "evento"
+
+    def __init__(self, etapa):
+        self.etapa = etapa
+        self.instante = time.time()
+
+    def to_dict(self):
+        datos = {"tipo": self.tipo}
+        datos.update(vars(self))
+        return datos
+
+
+class InicioEtapa(Evento):
+    """Empieza una etapa; total es el número de secciones previsto (None si no se sabe)."""
+
+    tipo = "inicio_etapa"
+
+    def __init__(self, etapa, total=None, mensaje=""):
+        super().__init__(etapa)
+        self.total = total
+        self.mensaje = mensaje
+
+
+class FinEtapa(Evento):
+    """
+    Termina una etapa, con su duración, los bytes escritos, los tiempos por fase (segundos)
+    y contadores propios de la etapa (por ejemplo, aciertos y fallos de una caché).
+    """
+
+    tipo = "fin_etapa"
+
+    def __init__(self, etapa, segundos, bytes_escritos=0, tiempos=None, mensaje="", contadores=None):
+        super().__init__(etapa)
+        self.segundos = segundos
+        self.bytes_escritos = bytes_escritos
+        self.tiempos = tiempos or {}
+        self.mensaje = mensaje
+        self.contadores = contadores or {}
+
+
+class AvanceSeccion(Evento):
+    """
+    Se ha procesado la sección hecho de total. tiempos recoge los segundos dedicados
+    a cada fase de esa sección: parse, mutate y save (o las que apliquen).
+    """
+
+    tipo = "seccion"
+
+    def __init__(self, etapa, hecho, total, codigo="", ruta="", bytes_escritos=0, tiempos=None):
+        super().__init__(etapa)
+        self.hecho = hecho
+        self.total = total
+        self.codigo = codigo
+        self.ruta = ruta
+        self.bytes_escritos = bytes_escritos
+        self.tiempos = tiempos or {}
+
+
+class Mensaje(Evento):
+    """Texto informativo o aviso (nivel NIVEL_INFO o NIVEL_AVISO) emitido durante una etapa."""
+
+    tipo = "mensaje"
+
+    def __init__(self, etapa, texto, nivel=NIVEL_INFO):
+        super().__init__(etapa)
+        self.texto = texto
+        self.nivel = nivel
+
+
+class Progreso:
+    """
+    Emisor de eventos de progreso. Las etapas (Excel, división y fusión) solo llaman
+    a sus métodos; quien quiera enterarse (consola, GUI, registro JSON) se suscribe
+    con un callable que recibe cada Evento.
+    """
+
+    def __init__(self, *suscriptores):
+        self.suscriptores = list(suscriptores)
+        self._inicios = {}
+        self._lock = threading.Lock()
+
+    def suscribir(self, suscriptor):
+        self.suscriptores.append(suscriptor)
+        return suscriptor
+
+    def emitir(self, evento):
+        with self._lock:
+            for suscriptor in self.suscriptores:
+                suscriptor(evento)
+
+    def inicio_etapa(self, etapa, total=None, mensaje=""):
+        self._inicios[etapa] = time.perf_counter()
+        self.emitir(InicioEtapa(etapa, total, mensaje))
+
+    def fin_etapa(self, etapa, bytes_escritos=0, tiempos=None, mensaje="", contadores=None):
+        inicio = self._inicios.pop(etapa, None)
+        segundos = time.perf_counter() - inicio if inicio is not None else 0.0
+        self.emitir(FinEtapa(etapa, segundos, bytes_escritos, tiempos, mensaje, contadores))
+
+    def seccion(self, etapa, hecho, total, codigo="", ruta="", bytes_escritos=0, tiempos=None):
+        self.emitir(AvanceSeccion(etapa, hecho, total, codigo, ruta, bytes_escritos, tiempos))
+
+    def mensaje(self, etapa, texto, nivel=NIVEL_INFO):
+        self.emitir(Mensaje(etapa, texto, nivel))
+
+    def aviso(self, etapa, texto):
+        self.emitir(Mensaje(etapa, texto, NIVEL_AVISO))
+
+
+def como_progreso(progreso):
+    """
+    Normaliza el argumento progreso de las funciones públicas:
+    - None: un Progreso que escribe en consola, como hacían los antiguos print().
+    - Progreso: se usa tal cual.
+    - callable(hecho, total, mensaje): se adapta para recibir solo el avance por sección.
+    """
+    if progreso is None:
+        return Progreso(ImpresorConsola())
+    if isinstance(progreso, Progreso):
+        return progreso
+    callback = progreso
+
+    def adaptador(evento):
+        if isinstance(evento, AvanceSeccion):
+            callback(evento.hecho, evento.total, evento.codigo)
+
+    return Progreso(adaptador)
+
+
+class ImpresorConsola:
+    """
+    Suscriptor que escribe los eventos en consola con los mismos mensajes de siempre.
+    cada permite imprimir solo una de cada N secciones (las consolas de Windows son lentas).
+    """
+
+    def __init__(self, cada=1):
+        self.cada = max(1, cada)
+
+    def __call__(self, evento):
+        if isinstance(evento, AvanceSeccion):
+            if evento.hecho % self.cada and evento.hecho != evento.total:
+                return
+            if evento.etapa == ETAPA_DIVISION:
+                print(f"  Guardado sección: {evento.ruta}")
+            elif evento.etapa == ETAPA_FUSION:
+                print(f"⟳ Concatenando sección '{evento.codigo}' desde: {evento.ruta}")
+            elif evento.etapa == ETAPA_LOTE:
+                print(f"Anexo {evento.hecho}/{evento.total} '{evento.codigo}' guardado en: {evento.ruta}")
+            else:
+                print(f"  {evento.etapa}: {evento.hecho}/{evento.total} {evento.codigo}")
+        elif isinstance(evento, InicioEtapa) and evento.mensaje:
+            print(evento.mensaje)
+        elif isinstance(evento, Mensaje):
+            print(evento.texto)
+        elif isinstance(evento, FinEtapa):
+            if evento.mensaje:
+                print(evento.mensaje)
+            if evento.contadores:
+                print("  " + ", ".join(f"{nombre}: {valor}" for nombre, valor in evento.contadores.items()))
+
+
+class RegistroJsonl:
+    """
+    Suscriptor que añade cada evento como una línea JSON al fichero indicado.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._f = open(path, "a", encoding="utf-8")
+
+    def __call__(self, evento):
+        self._f.write(json.dumps(evento.to_dict(), ensure_ascii=False) + "\n")
+        self._f.flush()
+
+    def close(self):
+        self._f.close()
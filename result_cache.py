@@ -0,0 +1,92 @@
+import os
+import json
+import shutil
+import hashlib
+from progress import ETAPA_FUSION, como_progreso
+
+# Cambiar si cambia la forma de generar el anexo, para no servir resultados antiguos
+CACHE_VERSION = 2
+
+
+def hash_file(path, block_size=1024 * 1024):
+    """
+    Devuelve el sha1 del contenido de un fichero, leyéndolo por bloques.
+    """
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for bloque in iter(lambda: f.read(block_size), b""):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+class ResultCache:
+    """
+    Caché en disco de anexos ya generados, direccionada por contenido.
+    Cada entrada es <clave>.docx; su fecha de modificación marca el último uso y,
+    al superar max_bytes, se eliminan primero las entradas usadas hace más tiempo (LRU).
+    """
+
+    def __init__(self, cache_dir, max_bytes=1024 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    def make_key(self, code_list, section_paths, original_docx, motor):
+        """
+        Clave del anexo: lista ordenada de códigos, hash de cada sección usada, hash de original.docx
+        y motor de fusión (cada motor genera un .docx distinto).
+        """
+        datos = {
+            "version": CACHE_VERSION,
+            "codigos": list(code_list),
+            "secciones": [hash_file(p) for p in section_paths],
+            "original": hash_file(original_docx),
+            "motor": motor,
+        }
+        return hashlib.sha1(json.dumps(datos, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.docx")
+
+    def get(self, key, output_path):
+        """
+        Si la clave está en caché, copia el anexo guardado a output_path y devuelve True.
+        """
+        entrada = self._entry_path(key)
+        if not os.path.exists(entrada):
+            return False
+        shutil.copyfile(entrada, output_path)
+        # marcar como usado recientemente
+        os.utime(entrada, None)
+        return True
+
+    def put(self, key, output_path, progreso=None, etapa=ETAPA_FUSION):
+        """
+        Guarda una copia del anexo generado y aplica la política de tamaño (ver evict).
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        entrada = self._entry_path(key)
+        temporal = f"{entrada}.{os.getpid()}.tmp"
+        shutil.copyfile(output_path, temporal)
+        os.replace(temporal, entrada)
+        self.evict(progreso, etapa)
+
+    def evict(self, progreso=None, etapa=ETAPA_FUSION):
+        """
+        Elimina las entradas menos usadas hasta que el total quede por debajo de max_bytes.
+        Cada entrada eliminada se envía como aviso de la etapa indicada a progreso.
+        """
+        entradas = []
+        for nombre in os.listdir(self.cache_dir):
+            if not nombre.endswith(".docx"):
+                continue
+            ruta = os.path.join(self.cache_dir, nombre)
+            stat = os.stat(ruta)
+            entradas.append((stat.st_mtime, stat.st_size, ruta))
+        total = sum(size for _, size, _ in entradas)
+        progreso = como_progreso(progreso)
+        for _, size, ruta in sorted(entradas):
+            if total <= self.max_bytes:
+                break
+            os.remove(ruta)
+            total -= size
+            progreso.aviso(etapa, f"Eliminado de la caché de anexos: {ruta}")
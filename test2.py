@@ -1,22 +1,49 @@
 from docx import Document
+from docx.enum.style import WD_STYLE_TYPE
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsmap, qn
+from docx.text.paragraph import Paragraph
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from lxml import etree
+from array import array
+import io
 import re
 import os
 import math
-
-
-def is_heading3(paragraph):
-    """Detecta si un párrafo tiene estilo Título 3 (Heading 3)."""
-    return paragraph.style.name in ("Heading 3", "Título 3")
-
-
-def is_heading12(paragraph):
-    """Detecta si un párrafo tiene estilo Título 1 o 2 (Heading 1/2)."""
-    return paragraph.style.name in (
-        "Heading 1",
-        "Título 1",
-        "Heading 2",
-        "Título 2",
-    )
+import json
+import hashlib
+import time
+from docx_package import guardar_docx, write_package
+from progress import ETAPA_DIVISION, comprobar_cancelacion, como_progreso
+
+# Manifiesto con el hash de cada sección escrita, en la carpeta de salida del divisor.
+# Si cambia el formato de las secciones hay que subir VERSION_MANIFIESTO para forzar una reescritura completa.
+MANIFIESTO_SECCIONES = "sections_manifest.json"
+VERSION_MANIFIESTO = 2
+
+# Relaciones del documento que una sección solo conserva si su XML las referencia
+RELS_PODABLES = {
+    RT.IMAGE, RT.HYPERLINK, RT.HEADER, RT.FOOTER, RT.OLE_OBJECT, RT.PACKAGE, RT.CHART,
+    RT.DIAGRAM_DATA, RT.DIAGRAM_LAYOUT, RT.DIAGRAM_QUICK_STYLE, RT.DIAGRAM_COLORS,
+    RT.VIDEO, RT.AUDIO,
+    "http://schemas.microsoft.com/office/2007/relationships/diagramDrawing",
+    "http://schemas.microsoft.com/office/2007/relationships/media",
+}
+
+
+# Nombre de estilo -> nivel de heading reconocido por el divisor
+NIVELES_HEADING = {
+    "Heading 1": 1,
+    "Título 1": 1,
+    "Heading 2": 2,
+    "Título 2": 2,
+    "Heading 3": 3,
+    "Título 3": 3,
+}
+# Valores especiales de ClasificacionCuerpo.niveles
+NO_PARRAFO = -1
+SIN_HEADING = 0
 
 
 def safe_title(text, max_len=50):
@@ -24,215 +51,386 @@ def safe_title(text, max_len=50):
     return t[:max_len] if t else "SIN_TITULO"
 
 
-def get_para_element_positions(doc):
+class ClasificacionCuerpo:
     """
-    Devuelve una lista con la posición (índice en body.iterchildren())
-    de cada párrafo del documento, en el mismo orden que doc.paragraphs.
-    También devuelve la lista completa de elementos (elems) y el body.
+    Clasificación de los hijos del body hecha en una sola pasada, resolviendo cada estilo
+    una sola vez. elems son los elementos en el orden de body.iterchildren() y niveles
+    (array compacto, misma posición) el nivel de heading 1-3 de cada uno, SIN_HEADING o
+    NO_PARRAFO (tablas, sectPr, etc.).
     """
-    body = doc.element.body
-    elems = list(body.iterchildren())
-    id_map = {id(el): idx for idx, el in enumerate(elems)}
-    positions = []
-    for p in doc.paragraphs:
-        pos = id_map.get(id(p._p))
-        if pos is None:
-            positions.append(-1)
-        else:
-            positions.append(pos)
-    return positions, elems, body
-
 
-def remove_outside_range(body, elems, keep_start, keep_end):
+    def __init__(self, doc):
+        self.elems = list(doc.element.body.iterchildren())
+        self.niveles = array("b")
+
+        niveles_estilo = {}
+        tag_p = qn("w:p")
+        for el in self.elems:
+            if el.tag != tag_p:
+                self.niveles.append(NO_PARRAFO)
+                continue
+            style_id = el.style
+            if style_id not in niveles_estilo:
+                # misma resolución que Paragraph.style: ids desconocidos usan el estilo por defecto
+                nombre = doc.part.get_style(style_id, WD_STYLE_TYPE.PARAGRAPH).name
+                niveles_estilo[style_id] = NIVELES_HEADING.get(nombre, SIN_HEADING)
+            self.niveles.append(niveles_estilo[style_id])
+
+
+def extraer_secciones_heading3(doc, clasificacion=None):
+    """
+    Agrupa los elementos del body por sección Heading 3 a partir de la clasificación del cuerpo
+    (se calcula si no se pasa). Cada sección empieza en su Heading 3 y llega hasta el elemento
+    anterior al siguiente Heading 3 (o al final del body). Los Heading 1/2 y el sectPr del body
+    se descartan, igual que el contenido previo al primer Heading 3.
+    Devuelve una lista de tuplas (codigo, [elementos]) en orden de aparición.
     """
-    Elimina del body todos los elems cuyo índice no esté entre keep_start y keep_end (inclusive).
+    if clasificacion is None:
+        clasificacion = ClasificacionCuerpo(doc)
+    tag_sectpr = qn("w:sectPr")
+    secciones = []
+    actual = None
+    for el, nivel in zip(clasificacion.elems, clasificacion.niveles):
+        if nivel == 3:
+            title = safe_title(Paragraph(el, doc._body).text)
+            # construir nombre: solo el código extraído (antes del primer guion bajo si lo hay)
+            codigo = title.split("_")[0] if "_" in title else title
+            actual = [el]
+            secciones.append((codigo, actual))
+        elif nivel in (1, 2) or el.tag == tag_sectpr:
+            continue
+        elif actual is not None:
+            actual.append(el)
+    return secciones
+
+
+class EscritorSecciones:
+    """
+    Escribe documentos de sección a partir del paquete de un documento origen ya abierto.
+    Cada sección solo incluye las relaciones del documento (imágenes, hipervínculos, cabeceras...)
+    que su XML referencia; estilos, numeración, tema, etc. se conservan siempre. Las partes que
+    no cambian entre secciones se comprimen una sola vez y se reutilizan en todos los zips.
     """
-    for idx in reversed(range(len(elems))):
-        if idx < keep_start or idx > keep_end:
-            body.remove(elems[idx])
 
+    def __init__(self, doc):
+        self.doc = doc
+        self._comprimidas = {}
+        for part in doc.part.package.parts:
+            part.before_marshal()
+
+    def guardar(self, elems, out_path):
+        """
+        Sustituye el contenido del body por los elementos de la sección y escribe el paquete.
+        Los elementos se mueven (no se copian) entre secciones, así que el body del documento
+        queda inservible para otros usos después de llamar a este método.
+        Devuelve los bytes escritos y los segundos de las fases mutate y save.
+        """
+        t0 = time.perf_counter()
+        body = self.doc.element.body
+        for el in list(body.iterchildren()):
+            body.remove(el)
+        body.extend(elems)
+
+        referenciados = {
+            valor for el in elems for sub in el.iter(etree.Element) for valor in sub.attrib.values()
+        }
+        rels = [
+            rel for rel in self.doc.part.rels.values()
+            if rel.reltype not in RELS_PODABLES or rel.rId in referenciados
+        ]
+        t1 = time.perf_counter()
+        escritos = write_package(
+            self.doc.part.package,
+            out_path,
+            rels_por_parte={self.doc.part: rels},
+            blobs={self.doc.part: self.doc.part.blob},
+            comprimidas=self._comprimidas,
+        )
+        return {"bytes": escritos, "mutate": t1 - t0, "save": time.perf_counter() - t1}
 
-def remove_heading1_2(doc):
+
+def hash_paquete(doc):
     """
-    Elimina del documento todos los párrafos que sean Heading 1 o Heading 2.
-    Opera directamente sobre doc.element.body.
+    Hash de todas las partes del paquete salvo el cuerpo del documento (estilos, numeración,
+    tema, imágenes...). Si cambia, todas las secciones deben reescribirse.
+    Las propiedades (docProps) y settings.xml se ignoran: Word las reescribe en cada guardado
+    (autor, fechas, rsids) aunque el contenido no cambie.
     """
-    para_positions, elems, body = get_para_element_positions(doc)
-    # recolectar índices de elems que corresponden a párrafos H1/H2
-    indices_to_remove = []
-    for i, p in enumerate(doc.paragraphs):
-        if is_heading12(p):
-            if i < len(para_positions):
-                pos = para_positions[i]
-                if pos != -1:
-                    indices_to_remove.append(pos)
-    # eliminar en orden inverso (y evitando duplicados)
-    for idx in sorted(set(indices_to_remove), reverse=True):
-        # protección: el índice podría estar fuera del rango si elems se ha modificado; comprobamos
-        if 0 <= idx < len(elems):
-            try:
-                body.remove(elems[idx])
-            except Exception:
-                # en caso de algún fallo (no crítico), continuamos
-                pass
+    h = hashlib.sha1()
+    for part in sorted(doc.part.package.parts, key=lambda p: str(p.partname)):
+        nombre = str(part.partname)
+        if part is doc.part or nombre.startswith("/docProps/") or nombre == "/word/settings.xml":
+            continue
+        h.update(nombre.encode("utf-8"))
+        h.update(part.blob)
+    return h.hexdigest()
 
 
-def make_chunk_doc(original_path, keep_start_elem_idx, keep_end_elem_idx, out_path):
+def hash_seccion(doc, elems):
+    """
+    Hash del XML de los elementos de la sección y del contenido de las partes
+    (imágenes, enlaces...) a las que hacen referencia sus relaciones.
+    """
+    h = hashlib.sha1()
+    rels = doc.part.rels
+    ns_rel = "{%s}" % nsmap["r"]
+    for el in elems:
+        h.update(etree.tostring(el))
+        for sub in el.iter():
+            for nombre, valor in sub.attrib.items():
+                if not nombre.startswith(ns_rel) or valor not in rels:
+                    continue
+                rel = rels[valor]
+                if rel.is_external:
+                    h.update(rel.target_ref.encode("utf-8"))
+                else:
+                    h.update(rel.target_part.blob)
+    return h.hexdigest()
+
+
+def leer_manifiesto(output_dir):
     """
-    Crea un documento que contiene únicamente los elementos entre keep_start_elem_idx y keep_end_elem_idx
-    (índices sobre elems, no sobre paragraphs). Después elimina Heading1/2.
+    Devuelve el manifiesto de la última división en output_dir, o None si no existe o no es válido.
     """
-    doc = Document(original_path)
-    # recalculamos elems/positions sobre esta copia
-    para_positions, elems, body = get_para_element_positions(doc)
-    remove_outside_range(body, elems, keep_start_elem_idx, keep_end_elem_idx)
-    # eliminar Heading 1 y 2 si existen
-    remove_heading1_2(doc)
-    doc.save(out_path)
+    ruta = os.path.join(output_dir, MANIFIESTO_SECCIONES)
+    try:
+        with open(ruta, "r", encoding="utf-8") as f:
+            manifiesto = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifiesto.get("version") != VERSION_MANIFIESTO:
+        return None
+    return manifiesto
+
+
+def guardar_manifiesto(output_dir, paquete, hashes):
+    ruta = os.path.join(output_dir, MANIFIESTO_SECCIONES)
+    with open(ruta, "w", encoding="utf-8") as f:
+        json.dump({"version": VERSION_MANIFIESTO, "paquete": paquete, "secciones": hashes}, f, indent=1)
 
 
-def split_chunk_into_sections(chunk_path, out_dir):
+def repartir_en_lotes(codigos, n_chunks):
     """
-    A partir de un chunk (documento más pequeño), genera los docx por sección Heading 3.
-    Elimina Heading1/2 en cada sección también (por si quedara alguno).
+    Divide la lista de códigos en como mucho n_chunks lotes contiguos de tamaño similar.
     """
-    chunk = Document(chunk_path)
-    paras = chunk.paragraphs
+    if not codigos:
+        return []
+    per_chunk = math.ceil(len(codigos) / max(1, n_chunks))
+    return [codigos[i:i + per_chunk] for i in range(0, len(codigos), per_chunk)]
 
-    # encontrar índices de párrafos que son Heading3 dentro del chunk
-    section_indices = []
-    for idx, p in enumerate(paras):
-        if is_heading3(p):
-            title_clean = safe_title(p.text)
-            section_indices.append((idx, title_clean))
-    # añadir final
-    section_indices.append((len(paras), "FIN"))
 
-    for i in range(len(section_indices) - 1):
-        start_para, title = section_indices[i]
-        end_para, _ = section_indices[i + 1]
+def guardar_chunks(escritor, por_codigo, lotes, output_dir, progreso):
+    """
+    Modo depuración: escribe en chunks/chunk_NN.docx el contenido de cada lote de secciones.
+    Los chunks no se usan para generar las secciones; solo sirven para inspeccionar el reparto.
+    """
+    chunks_dir = os.path.join(output_dir, "chunks")
+    os.makedirs(chunks_dir, exist_ok=True)
+    for chunk_i, lote in enumerate(lotes):
+        elems = [el for codigo in lote for el in por_codigo[codigo]]
+        chunk_path = os.path.join(chunks_dir, f"chunk_{chunk_i + 1:02d}.docx")
+        escritor.guardar(elems, chunk_path)
+        progreso.mensaje(ETAPA_DIVISION, f"Creado chunk {chunk_i + 1}/{len(lotes)}: {chunk_path} ({len(lote)} secciones)")
 
-        # Reabrir chunk original (más pequeño) para recortar a la sección
-        doc = Document(chunk_path)
-        para_positions, elems, body = get_para_element_positions(doc)
 
-        # sanity check
-        if start_para >= len(para_positions) or (end_para - 1) >= len(para_positions):
-            keep_start = 0
-            keep_end = len(elems) - 1
-        else:
-            keep_start = para_positions[start_para]
-            keep_end = para_positions[end_para - 1]
+# Estado de cada proceso del pool: el paquete plantilla (original con el body vacío)
+# se abre una sola vez por proceso y las secciones llegan como XML serializado.
+_escritor_worker = None
 
-        # eliminar todo lo que no pertenezca
-        remove_outside_range(body, elems, keep_start, keep_end)
 
-        # eliminar Heading1/2 que pudieran quedar dentro de la sección
-        remove_heading1_2(doc)
+def _iniciar_worker(plantilla):
+    global _escritor_worker
+    _escritor_worker = EscritorSecciones(Document(io.BytesIO(plantilla)))
 
-        # construir nombre: solo el código extraído (antes del primer guion bajo si lo hay)
-        codigo = title.split("_")[0] if "_" in title else title
-        filename = f"{codigo}.docx"
-        out_path = os.path.join(out_dir, filename)
-        doc.save(out_path)
-        print(f"  Guardado sección: {out_path}")
 
-
-def split_doc_by_heading3_parallel(input_path, output_dir, n_chunks=10):
+def _escribir_lote(lote, sections_dir):
     """
-    Proceso en dos fases:
-     1) Divide el documento original en n_chunks sub-documentos (por número de Heading3).
-     2) Recorre cada chunk y genera los docx finales por sección.
-    En la creación de cada chunk y en cada sección se eliminan Heading 1 y 2.
+    Escribe en el proceso actual las secciones del lote, una lista de
+    (codigo, [XML de cada elemento]), y devuelve (codigo, ruta, estadísticas) de cada una.
     """
-    if n_chunks < 1:
-        n_chunks = 1
-
-    original = Document(input_path)
-    paras = original.paragraphs
-
-    # Detectar índices de inicio de cada Heading3 en el original
-    section_starts = []
-    section_titles = []
-    for idx, p in enumerate(paras):
-        if is_heading3(p):
-            section_starts.append(idx)
-            section_titles.append(safe_title(p.text))
-    if not section_starts:
+    escritas = []
+    for codigo, xmls in lote:
+        out_path = os.path.join(sections_dir, f"{codigo}.docx")
+        t0 = time.perf_counter()
+        elems = [parse_xml(x) for x in xmls]
+        parse = time.perf_counter() - t0
+        estadisticas = _escritor_worker.guardar(elems, out_path)
+        estadisticas["parse"] = parse
+        escritas.append((codigo, out_path, estadisticas))
+    return escritas
+
+
+def split_doc_by_heading3(
+    input_path, output_dir, n_workers=1, n_chunks=None, incremental=False, debug_chunks=False,
+    progreso=None, cancelar=None,
+):
+    """
+    Divide el documento por Heading 3 en una sola pasada:
+     1) Abre el documento original una única vez y agrupa los elementos del body por sección.
+     2) Escribe cada sección en sections/<codigo>.docx reutilizando ese mismo árbol en memoria.
+    Los Heading 1 y 2 no se incluyen en ninguna sección.
+    Si varias secciones comparten código, prevalece la última (como al sobrescribir el fichero).
+
+    Con n_workers > 1 las secciones se reparten en n_chunks lotes que escriben en paralelo
+    procesos independientes. Cada proceso recibe una única vez el paquete original con el body
+    vacío y, por cada sección, el XML serializado de sus elementos; no se escribe ningún fichero
+    intermedio. n_workers=None usa todos los núcleos. La salida es idéntica byte a byte a la
+    del modo secuencial.
+
+    Con debug_chunks=True se escriben además los lotes en chunks/chunk_NN.docx para depuración.
+
+    En cada ejecución se guarda en output_dir un manifiesto con el hash de cada sección.
+    Con incremental=True solo se reescriben las secciones cuyo hash ha cambiado (o cuyo
+    fichero falta) y se borran las que ya no existen en el documento.
+
+    progreso (ver progress.como_progreso) recibe los eventos de la etapa ETAPA_DIVISION:
+    inicio, cada sección escrita (bytes y tiempos de parse/mutate/save) y fin. Si cancelar
+    (threading.Event) se activa, se para entre dos secciones con ProcesoCancelado; el
+    manifiesto solo recoge entonces las secciones ya escritas o sin cambios.
+    """
+    if n_workers is None:
+        n_workers = os.cpu_count() or 1
+    progreso = como_progreso(progreso)
+    progreso.inicio_etapa(ETAPA_DIVISION)
+
+    t0 = time.perf_counter()
+    doc = Document(input_path)
+    secciones = extraer_secciones_heading3(doc, ClasificacionCuerpo(doc))
+    tiempos = {"parse": time.perf_counter() - t0, "mutate": 0.0, "save": 0.0}
+    if not secciones:
         raise ValueError("No se han encontrado Heading 3 en el documento.")
+    por_codigo = dict(secciones)
 
-    # añadir índice final (len(paras)) para facilitar cálculos
-    section_starts_with_end = section_starts[:] + [len(paras)]
-
-    # determinar agrupamiento en chunks (distribución aproximada)
-    total_sections = len(section_starts)
-    per_chunk = math.ceil(total_sections / n_chunks)
-    # ajustamos n_chunks real si hay menos secciones que chunks pedidas
-    n_chunks_real = math.ceil(total_sections / per_chunk)
-
-    # crear carpetas
-    os.makedirs(output_dir, exist_ok=True)
-    chunks_dir = os.path.join(output_dir, "chunks")
-    os.makedirs(chunks_dir, exist_ok=True)
     sections_dir = os.path.join(output_dir, "sections")
     os.makedirs(sections_dir, exist_ok=True)
 
-    print(
-        f"Total de secciones: {total_sections}. Creando {n_chunks_real} chunks (aprox {per_chunk} secciones por chunk)."
-    )
+    progreso.mensaje(ETAPA_DIVISION, f"Total de secciones: {len(secciones)} ({len(por_codigo)} ficheros distintos).")
+
+    paquete = hash_paquete(doc)
+    hashes = {codigo: hash_seccion(doc, elems) for codigo, elems in por_codigo.items()}
+    pendientes = list(por_codigo)
+    anterior = leer_manifiesto(output_dir) if incremental else None
+    if anterior is not None:
+        if anterior["paquete"] == paquete:
+            pendientes = [
+                codigo for codigo in pendientes
+                if anterior["secciones"].get(codigo) != hashes[codigo]
+                or not os.path.exists(os.path.join(sections_dir, f"{codigo}.docx"))
+            ]
+        for codigo in anterior["secciones"]:
+            if codigo not in por_codigo:
+                obsoleta = os.path.join(sections_dir, f"{codigo}.docx")
+                if os.path.exists(obsoleta):
+                    os.remove(obsoleta)
+                    progreso.mensaje(ETAPA_DIVISION, f"  Eliminada sección: {obsoleta}")
+        progreso.mensaje(
+            ETAPA_DIVISION,
+            f"Secciones sin cambios: {len(por_codigo) - len(pendientes)}. Secciones a escribir: {len(pendientes)}.",
+        )
 
-    # generar chunks
-    for chunk_i in range(n_chunks_real):
-        # secciones cubiertas por este chunk (índices en section_starts)
-        s_idx = chunk_i * per_chunk
-        e_idx = min((chunk_i + 1) * per_chunk - 1, total_sections - 1)
-
-        start_para = section_starts_with_end[s_idx]
-        # si e_idx + 1 < len(section_starts_with_end) entonces el siguiente inicio marca el final,
-        # en caso contrario final es len(paras)
-        if (e_idx + 1) < len(section_starts_with_end):
-            end_para = section_starts_with_end[e_idx + 1]
+    escritor = EscritorSecciones(doc)
+    if debug_chunks:
+        lotes = repartir_en_lotes(list(por_codigo), n_chunks or 10)
+        guardar_chunks(escritor, por_codigo, lotes, output_dir, progreso)
+
+    escritas = set()
+    total = len(pendientes)
+    bytes_escritos = 0
+
+    def registrar(codigo, out_path, estadisticas):
+        nonlocal bytes_escritos
+        escritas.add(codigo)
+        bytes_escritos += estadisticas["bytes"]
+        fases = {fase: estadisticas[fase] for fase in ("parse", "mutate", "save") if fase in estadisticas}
+        for fase, segundos in fases.items():
+            tiempos[fase] += segundos
+        progreso.seccion(ETAPA_DIVISION, len(escritas), total, codigo, out_path, estadisticas["bytes"], fases)
+
+    try:
+        if n_workers <= 1 or len(pendientes) < 2:
+            for codigo in pendientes:
+                comprobar_cancelacion(cancelar)
+                out_path = os.path.join(sections_dir, f"{codigo}.docx")
+                registrar(codigo, out_path, escritor.guardar(por_codigo[codigo], out_path))
         else:
-            end_para = len(paras)
-
-        # Para crear el chunk calculamos los índices sobre elems usando una copia del original
-        doc = Document(input_path)
-        para_positions, elems, body = get_para_element_positions(doc)
-
-        # convertir start_para/end_para (índices sobre paragraphs del original) a índices sobre elems
-        keep_start = para_positions[start_para]
-        keep_end = (
-            para_positions[end_para - 1]
-            if (end_para - 1) < len(para_positions)
-            else len(elems) - 1
+            _escribir_en_paralelo(
+                doc, por_codigo, pendientes, sections_dir, n_workers, n_chunks, registrar, cancelar, progreso
+            )
+    except BaseException:
+        # guardar solo lo que se sabe consistente para que el modo incremental pueda continuar
+        guardar_manifiesto(
+            output_dir, paquete,
+            {c: h for c, h in hashes.items() if c in escritas or c not in pendientes},
         )
+        raise
 
-        chunk_filename = f"chunk_{chunk_i + 1:02d}.docx"
-        chunk_path = os.path.join(chunks_dir, chunk_filename)
-
-        # eliminar fuera del rango y luego Heading1/2
-        remove_outside_range(body, elems, keep_start, keep_end)
-        # El chunk ya no tendrá Heading1/2
-        remove_heading1_2(doc)
-        doc.save(chunk_path)
-        print(
-            f"Creado chunk {chunk_i + 1}/{n_chunks_real}: {chunk_path} (secciones {s_idx + 1} a {e_idx + 1})"
-        )
+    guardar_manifiesto(output_dir, paquete, hashes)
+    progreso.fin_etapa(
+        ETAPA_DIVISION, bytes_escritos, tiempos,
+        f"Proceso completado.\nArchivos de secciones guardados en: {sections_dir}",
+    )
+    return sections_dir
 
-    # ahora recorremos los chunks y los dividimos en secciones finales
-    chunk_files = sorted(os.listdir(chunks_dir))
-    for cf in chunk_files:
-        chunk_path = os.path.join(chunks_dir, cf)
-        print(f"Procesando {chunk_path} ...")
-        split_chunk_into_sections(chunk_path, sections_dir)
 
-    print("Proceso completado.")
-    print(f"Archivos de secciones guardados en: {sections_dir}")
+def _escribir_en_paralelo(
+    doc, por_codigo, pendientes, sections_dir, n_workers, n_chunks, registrar, cancelar, progreso
+):
+    """
+    Reparte las secciones pendientes en lotes y las escribe con un pool de procesos.
+    Llama a registrar(codigo, ruta, estadísticas) por cada sección terminada;
+    si se cancela, descarta los lotes no empezados.
+    """
+    # varios lotes por proceso para repartir mejor las secciones largas
+    if not n_chunks or n_chunks < n_workers:
+        n_chunks = n_workers * 4
+    lotes = repartir_en_lotes(pendientes, n_chunks)
+    # plantilla: el mismo paquete sin contenido en el body
+    body = doc.element.body
+    for el in list(body.iterchildren()):
+        body.remove(el)
+    plantilla = io.BytesIO()
+    guardar_docx(doc, plantilla)
+    progreso.mensaje(ETAPA_DIVISION, f"Escribiendo {len(lotes)} lotes con {n_workers} procesos.")
+    with ProcessPoolExecutor(
+        max_workers=n_workers, initializer=_iniciar_worker, initargs=(plantilla.getvalue(),)
+    ) as pool:
+        futuros = [
+            pool.submit(
+                _escribir_lote,
+                [(codigo, [etree.tostring(el) for el in por_codigo[codigo]]) for codigo in lote],
+                sections_dir,
+            )
+            for lote in lotes
+        ]
+        try:
+            for futuro in as_completed(futuros):
+                for codigo, out_path, estadisticas in futuro.result():
+                    registrar(codigo, out_path, estadisticas)
+                comprobar_cancelacion(cancelar)
+        except BaseException:
+            pool.shutdown(wait=True, cancel_futures=True)
+            raise
+
+
+def split_doc_by_heading3_parallel(
+    input_path, output_dir, n_chunks=10, n_workers=1, incremental=False, debug_chunks=False,
+    progreso=None, cancelar=None,
+):
+    """
+    Punto de entrada histórico del divisor por Heading 3.
+    Delega en split_doc_by_heading3; n_chunks solo indica en cuántos lotes se reparten
+    las secciones entre los n_workers procesos (y en cuántos chunks de depuración).
+    """
+    return split_doc_by_heading3(
+        input_path, output_dir, n_workers=n_workers, n_chunks=n_chunks,
+        incremental=incremental, debug_chunks=debug_chunks, progreso=progreso, cancelar=cancelar,
+    )
 
 
 if __name__ == "__main__":
     INPUT_DOCX = "PPT9010_completo_limpio.docx"  # ruta a tu documento original
     OUTPUT_DIR = "secciones2"  # Carpeta de salida
     N_CHUNKS = 15  # ajusta a lo que quieras (p.ej. 10)
+    N_WORKERS = os.cpu_count() or 1  # procesos en paralelo (1 = secuencial)
 
-    split_doc_by_heading3_parallel(INPUT_DOCX, OUTPUT_DIR, n_chunks=N_CHUNKS)
+    split_doc_by_heading3_parallel(INPUT_DOCX, OUTPUT_DIR, n_chunks=N_CHUNKS, n_workers=N_WORKERS)
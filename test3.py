@@ -1,54 +1,199 @@
+import io
 import os
-import glob
-from docx import Document
+import re
+import json
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+from docx.shared import Pt
 from docxcompose.composer import Composer
+from config import (
+    MOTOR_COMPOSER, MOTOR_DIRECTO, MOTOR_STREAMING, SECTION_CACHE_MAX_BYTES, SECTION_CACHE_MAX_ITEMS,
+)
+from document_cache import DocumentCache
+from ensamblador import ContenidoNoSoportado, EnsambladorDirecto, EnsambladorStreaming
+from progress import ETAPA_FUSION, comprobar_cancelacion, como_progreso
+
+# Motores de fusión: EnsambladorDirecto (rápido, secciones de un mismo maestro), su variante
+# EnsambladorStreaming (memoria acotada, escribe el anexo a medida que avanza) o docxcompose.Composer
+MOTORES = {MOTOR_DIRECTO: EnsambladorDirecto, MOTOR_STREAMING: EnsambladorStreaming, MOTOR_COMPOSER: Composer}
+
+# El motor streaming promete la memoria de una sola sección: no usa la caché de secciones
+# y solo carga por adelantado PREFETCH_STREAMING secciones
+PREFETCH_STREAMING = 1
+SIN_CACHE = DocumentCache(0)
+
+SHORT_ID_RE = re.compile(r"[A-Z]{3}\d{3}")
+# Todas las apariciones (incluso solapadas) de un identificador corto dentro de un nombre de fichero
+SHORT_ID_EN_NOMBRE_RE = re.compile(r"(?=([A-Z]{3}\d{3}))")
+
+# Los códigos no añadidos de un anexo se guardan junto a él, en <anexo sin extensión>_codigos_no_añadidos.txt
+SUFIJO_NO_AÑADIDOS = "_codigos_no_añadidos.txt"
+
+# Secciones ya cargadas, compartidas por todos los Test3Factory del proceso
+# (desactivada salvo que config.SECTION_CACHE_MAX_ITEMS lo indique)
+CACHE_DOCUMENTOS = DocumentCache(SECTION_CACHE_MAX_ITEMS, SECTION_CACHE_MAX_BYTES)
+
+
+def crear_cache_secciones(cache_secciones):
+    """
+    DocumentCache de cache_secciones entradas (0 = ninguna), o None para usar CACHE_DOCUMENTOS.
+    """
+    return None if cache_secciones is None else DocumentCache(cache_secciones, SECTION_CACHE_MAX_BYTES)
+
+
+def ruta_codigos_no_añadidos(output_docx):
+    """
+    Fichero de códigos no añadidos del anexo output_docx (ver SUFIJO_NO_AÑADIDOS).
+    """
+    return os.path.splitext(output_docx)[0] + SUFIJO_NO_AÑADIDOS
+
+
+def crear_carpeta_salida(ruta):
+    """
+    Crea la carpeta donde se escribirá ruta, si no existe.
+    """
+    carpeta = os.path.dirname(ruta)
+    if carpeta:
+        os.makedirs(carpeta, exist_ok=True)
+
 
 class Test3Factory:
-    def __init__(self, original_docx, sections_dir, id_list, output_docx):
+    def __init__(
+        self, original_docx, sections_dir, id_list, output_docx,
+        section_cache=None, missing_codes_path=None, document_cache=None,
+    ):
+        """
+        section_cache es un diccionario opcional ruta -> contenido del .docx; las rutas que
+        estén en él (secciones u original_docx) se abren desde memoria en vez de leerse del disco.
+        missing_codes_path es el fichero donde merge_sections guarda los códigos no añadidos
+        (por defecto, junto a output_docx; ver ruta_codigos_no_añadidos).
+        document_cache (por defecto CACHE_DOCUMENTOS) guarda los documentos ya cargados, de modo
+        que una sección usada por varios identificadores o anexos solo se parsea una vez.
+        """
         self.original_docx = original_docx
         self.sections_dir = sections_dir
         self.id_list = id_list
         self.output_docx = output_docx
+        self.section_cache = section_cache if section_cache is not None else {}
+        if missing_codes_path is None and output_docx is not None:
+            missing_codes_path = ruta_codigos_no_añadidos(output_docx)
+        self.missing_codes_path = missing_codes_path
+        self.document_cache = document_cache if document_cache is not None else CACHE_DOCUMENTOS
+        self._section_indexes = {}
+        self.ambiguous_matches = {}
 
-    def find_section_file(self, section_dir, identifier):
-        import re
-        match = re.search(r"[A-Z]{3}\d{3}", identifier)
-        matches = []
-        short_id = identifier
-        if match:
-            short_id = match.group(0)
-            pattern = os.path.join(section_dir, f"*{short_id}*.docx")
-            matches = glob.glob(pattern)
-        if not matches:
-            print(f"Aviso: No se encontró ningún archivo para el identificador '{identifier}' (patrón usado: '{short_id}')")
+    def _abrir(self, path):
+        """
+        Devuelve lo que se pasa a Document(): la ruta o, si está en section_cache, su contenido.
+        """
+        contenido = self.section_cache.get(path)
+        return path if contenido is None else io.BytesIO(contenido)
+
+    def section_index_path(self, section_dir):
+        """
+        Ruta del índice persistido, junto a la carpeta de secciones: <carpeta>.index.json
+        """
+        return os.path.normpath(os.path.abspath(section_dir)) + ".index.json"
+
+    def build_section_index(self, section_dir):
+        """
+        Lista una sola vez la carpeta de secciones y construye el índice
+        identificador corto (3 letras + 3 números) -> nombre de fichero.
+        Si varios ficheros contienen el mismo identificador se elige, por este orden,
+        el que empieza por el identificador, el de nombre más corto y el primero alfabéticamente.
+        Devuelve (indice, ambiguos), donde ambiguos recoge todos los candidatos de cada empate.
+        """
+        candidatos = {}
+        for nombre in sorted(os.listdir(section_dir)):
+            # los ficheros de bloqueo de Word (~$...) no son documentos válidos
+            if not nombre.lower().endswith(".docx") or nombre.startswith("~$"):
+                continue
+            for short_id in set(SHORT_ID_EN_NOMBRE_RE.findall(nombre)):
+                candidatos.setdefault(short_id, []).append(nombre)
+
+        indice = {}
+        ambiguos = {}
+        for short_id, nombres in candidatos.items():
+            nombres.sort(key=lambda n: (not n.startswith(short_id), len(n), n))
+            indice[short_id] = nombres[0]
+            if len(nombres) > 1:
+                ambiguos[short_id] = nombres
+        return indice, ambiguos
+
+    def load_section_index(self, section_dir, persist=True, progreso=None):
+        """
+        Devuelve el índice de la carpeta de secciones, construyéndolo solo si hace falta.
+        El índice persistido se reutiliza mientras la carpeta no cambie (mismo mtime),
+        de modo que las siguientes fusiones no vuelven a recorrer el directorio.
+        Los avisos (índice no guardado, identificadores ambiguos) se envían a progreso.
+        """
+        if section_dir in self._section_indexes:
+            return self._section_indexes[section_dir]
+        progreso = como_progreso(progreso)
+
+        index_path = self.section_index_path(section_dir)
+        dir_mtime = os.stat(section_dir).st_mtime_ns
+        datos = None
+        if os.path.exists(index_path):
+            try:
+                with open(index_path, "r", encoding="utf-8") as f:
+                    datos = json.load(f)
+                if datos.get("mtime_ns") != dir_mtime:
+                    datos = None
+            except (OSError, ValueError):
+                datos = None
+
+        if datos is None:
+            indice, ambiguos = self.build_section_index(section_dir)
+            datos = {"mtime_ns": dir_mtime, "indice": indice, "ambiguos": ambiguos}
+            if persist:
+                try:
+                    with open(index_path, "w", encoding="utf-8") as f:
+                        json.dump(datos, f, ensure_ascii=False, indent=1)
+                except OSError as e:
+                    progreso.aviso(
+                        ETAPA_FUSION, f"Aviso: no se pudo guardar el índice de secciones en '{index_path}': {e}"
+                    )
+
+        for short_id, nombres in datos["ambiguos"].items():
+            progreso.aviso(
+                ETAPA_FUSION,
+                f"Aviso: el identificador '{short_id}' coincide con varios archivos {nombres}; "
+                f"se usa '{datos['indice'][short_id]}'",
+            )
+        self.ambiguous_matches.update(datos["ambiguos"])
+        self._section_indexes[section_dir] = datos["indice"]
+        return datos["indice"]
+
+    def find_section_file(self, section_dir, identifier, progreso=None):
+        """
+        Ruta del fichero de sección de identifier, o None si no hay ninguno.
+        """
+        match = SHORT_ID_RE.search(identifier)
+        if not match:
+            return None
+        nombre = self.load_section_index(section_dir, progreso=progreso).get(match.group(0))
+        if nombre is None:
             return None
-        return matches[0]
+        return os.path.join(section_dir, nombre)
 
-    def update_heading3_title(self, doc_path, identifier, index):
+    def update_heading3_title(self, doc, identifier, index):
         """
-        Crea una copia temporal del documento doc_path, modifica el título de nivel 3 (Heading 3)
+        Modifica en memoria el título de nivel 3 (Heading 3) del documento ya cargado doc,
         sustituyendo el identificador recortado (3 letras + 3 números) por el identificador completo,
         elimina el símbolo '$' si existe, añade un número incremental al principio del título,
         y mantiene el formato original: fuente "Adif Fago No Regular", subrayado, negrita y tamaño 11.
-        Devuelve la ruta del nuevo archivo temporal.
+        Devuelve el mismo documento, listo para pasarlo a Composer.append.
         """
-        import re
-        import tempfile
-        import shutil
-        from docx import Document
-        from docx.shared import Pt
-
-        temp_fd, temp_path = tempfile.mkstemp(suffix=".docx")
-        os.close(temp_fd)
-        shutil.copy2(doc_path, temp_path)
-
-        match = re.search(r"[A-Z]{3}\d{3}", identifier)
+        match = SHORT_ID_RE.search(identifier)
         if match:
             short_id = match.group(0)
         else:
             short_id = identifier
 
-        doc = Document(temp_path)
         for p in doc.paragraphs:
             if p.style.name in ("Heading 3", "Título 3"):
                 clean_text = p.text.replace("$", "")
@@ -64,8 +209,6 @@ class Test3Factory:
                 run.font.size = Pt(11)
                 r = run._element
                 rPr = r.get_or_add_rPr()
-                from docx.oxml.ns import qn
-                from docx.oxml import OxmlElement
                 rFonts = OxmlElement('w:rFonts')
                 rFonts.set(qn('w:ascii'), "Adif Fago No Regular")
                 rFonts.set(qn('w:hAnsi'), "Adif Fago No Regular")
@@ -73,39 +216,190 @@ class Test3Factory:
                 rFonts.set(qn('w:cs'), "Adif Fago No Regular")
                 rPr.append(rFonts)
                 break
-        doc.save(temp_path)
-        return temp_path
-
-    def merge_sections_with_composer(self):
-        import tempfile
-        base_doc = Document(self.original_docx)
-        composer = Composer(base_doc)
-        temp_files = []
+        return doc
+
+    def load_section(self, path, identifier, index, document_cache=None):
+        """
+        Abre la sección (una copia desde document_cache, por defecto self.document_cache, si ya
+        se cargó) y le aplica la renumeración del Heading 3. Se ejecuta en los hilos de precarga.
+        Devuelve (documento, tiempos) con los segundos de las fases parse y mutate.
+        """
+        if document_cache is None:
+            document_cache = self.document_cache
+        t0 = time.perf_counter()
+        doc = document_cache.get(path, self._abrir(path))
+        t1 = time.perf_counter()
+        self.update_heading3_title(doc, identifier, index)
+        return doc, {"parse": t1 - t0, "mutate": time.perf_counter() - t1}
+
+    def iter_loaded_sections(self, secciones, prefetch=4, n_workers=2, document_cache=None):
+        """
+        Genera (identificador, ruta, documento, tiempos) en el mismo orden que secciones, cargando por
+        adelantado como máximo prefetch secciones en un pool de n_workers hilos mientras el
+        consumidor trabaja con la actual. Con prefetch=0 todo se carga en el hilo que consume.
+        document_cache se pasa a load_section.
+        """
+        if prefetch < 1:
+            for ident, path, idx in secciones:
+                yield (ident, path) + self.load_section(path, ident, idx, document_cache)
+            return
+
+        pendientes = deque()
+        siguientes = iter(secciones)
+        with ThreadPoolExecutor(max_workers=max(1, min(n_workers, prefetch))) as pool:
+
+            def encolar():
+                siguiente = next(siguientes, None)
+                if siguiente is not None:
+                    ident, path, idx = siguiente
+                    pendientes.append((ident, path, pool.submit(self.load_section, path, ident, idx, document_cache)))
+
+            for _ in range(prefetch):
+                encolar()
+            while pendientes:
+                ident, path, futuro = pendientes.popleft()
+                subdoc, tiempos = futuro.result()
+                # reponer la cola antes de entregar el documento para que la carga se solape con el append
+                encolar()
+                yield ident, path, subdoc, tiempos
+
+    def resolve_sections(self, progreso=None):
+        """
+        Localiza el fichero de cada identificador de id_list.
+        Devuelve (secciones, codigos_no_añadidos), donde secciones es una lista de
+        (identificador, ruta, número de sección) en el orden de id_list.
+        Cada identificador sin fichero se envía como aviso a progreso.
+        """
+        progreso = como_progreso(progreso)
         codigos_no_añadidos = []
-        idx = 1
+        secciones = []
         for ident in self.id_list:
-            path = self.find_section_file(self.sections_dir, ident)
+            path = self.find_section_file(self.sections_dir, ident, progreso)
             if path is None:
-                print(f"⚠️ Se omite el identificador '{ident}' porque no se encontró archivo.")
+                match = SHORT_ID_RE.search(ident)
+                patron = f" (patrón usado: '{match.group(0)}')" if match else ""
+                progreso.aviso(
+                    ETAPA_FUSION, f"⚠️ Se omite el identificador '{ident}' porque no se encontró archivo{patron}."
+                )
                 codigos_no_añadidos.append(ident)
                 continue
-            temp_path = self.update_heading3_title(path, ident, idx)
-            temp_files.append(temp_path)
-            print(f"⟳ Concatenando sección '{ident}' desde: {temp_path}")
-            subdoc = Document(temp_path)
-            composer.append(subdoc)
-            idx += 1
-        composer.save(self.output_docx)
-        print(f"✅ Documento final guardado en: {self.output_docx}")
-        for temp_path in temp_files:
-            os.remove(temp_path)
-
-        # Guardar los códigos no añadidos en ficheros/codigos_no_añadidos.txt
-        txt_path = os.path.join("ficheros", "codigos_no_añadidos.txt")
+            secciones.append((ident, path, len(secciones) + 1))
+        return secciones, codigos_no_añadidos
+
+    def write_missing_codes(self, codigos_no_añadidos, progreso=None):
+        """
+        Guarda los códigos no añadidos en missing_codes_path (por defecto <output_docx sin extensión>_codigos_no_añadidos.txt)
+        """
+        txt_path = self.missing_codes_path
+        crear_carpeta_salida(txt_path)
         with open(txt_path, "w", encoding="utf-8") as f:
             for codigo in codigos_no_añadidos:
                 f.write(f"{codigo}\n")
-        print(f"Archivo de códigos no añadidos guardado en: {txt_path}")
+        como_progreso(progreso).mensaje(ETAPA_FUSION, f"Archivo de códigos no añadidos guardado en: {txt_path}")
+
+    def merge_sections_with_composer(
+        self, prefetch=4, n_workers=2, secciones=None, codigos_no_añadidos=None, progreso=None, cancelar=None
+    ):
+        """
+        Concatena las secciones con docxcompose.Composer (ver merge_sections).
+        """
+        self.merge_sections(
+            MOTOR_COMPOSER, prefetch, n_workers, secciones, codigos_no_añadidos, progreso, cancelar
+        )
+
+    def merge_sections(
+        self, motor=MOTOR_DIRECTO, prefetch=4, n_workers=2, secciones=None, codigos_no_añadidos=None,
+        progreso=None, cancelar=None,
+    ):
+        """
+        Concatena sobre original_docx las secciones de id_list, en ese orden.
+        motor elige cómo: MOTOR_DIRECTO (EnsambladorDirecto, mueve el body de cada sección y
+        resuelve estilos, numeración e imágenes de una vez), MOTOR_STREAMING (igual, pero escribe
+        cada sección en el zip de salida al añadirla, con la memoria de una sola sección: no usa
+        document_cache y carga por adelantado como mucho PREFETCH_STREAMING secciones) o
+        MOTOR_COMPOSER (docxcompose).
+        Si el ensamblador directo o el streaming no admiten una sección (ContenidoNoSoportado),
+        la fusión sigue con Composer desde el principio, sin reiniciar la etapa (ver _fusionar).
+        Las secciones se abren y renumeran en segundo plano (ver iter_loaded_sections);
+        prefetch limita cuántas hay cargadas en memoria a la espera del motor.
+        Si ya se llamó a resolve_sections, su resultado puede pasarse para no repetirlo.
+        progreso (ver progress.como_progreso) recibe los eventos de la etapa ETAPA_FUSION, con
+        los tiempos de parse, mutate y append de cada sección y el de save al final. Si cancelar
+        (threading.Event) se activa, se para antes de la siguiente con ProcesoCancelado.
+        """
+        progreso = como_progreso(progreso)
+        # antes de cargar nada: una carpeta de salida inexistente no debe descubrirse al guardar
+        crear_carpeta_salida(self.output_docx)
+        if secciones is None:
+            secciones, codigos_no_añadidos = self.resolve_sections(progreso)
+        self._fusionar(MOTORES[motor], secciones, prefetch, n_workers, progreso, cancelar)
+
+        self.write_missing_codes(codigos_no_añadidos or [], progreso)
+
+    def _fusionar(self, motor, secciones, prefetch, n_workers, progreso, cancelar):
+        total = len(secciones)
+        progreso.inicio_etapa(ETAPA_FUSION, total)
+        cache = self.document_cache
+        if motor is EnsambladorStreaming:
+            cache = SIN_CACHE
+            prefetch = min(prefetch, PREFETCH_STREAMING)
+        cache_inicial = cache.estadisticas()
+        base_doc = cache.get(self.original_docx, self._abrir(self.original_docx))
+        composer = motor(base_doc)
+
+        acumulados = {"parse": 0.0, "mutate": 0.0, "append": 0.0}
+        try:
+            for hechas, (ident, path, subdoc, tiempos) in enumerate(
+                self.iter_loaded_sections(secciones, prefetch, n_workers, cache), 1
+            ):
+                comprobar_cancelacion(cancelar)
+                t0 = time.perf_counter()
+                try:
+                    composer.append(subdoc)
+                except ContenidoNoSoportado as e:
+                    # el ensamblador comprueba la sección antes de tocarla: subdoc sigue intacto
+                    progreso.aviso(
+                        ETAPA_FUSION,
+                        f"Aviso: el ensamblador directo no admite la sección '{ident}' ({e}); se usa Composer.",
+                    )
+                    if hasattr(composer, "descartar"):
+                        composer.descartar()
+                    composer = self._pasar_a_composer(secciones[:hechas - 1], prefetch, n_workers, cache, cancelar)
+                    composer.append(subdoc)
+                tiempos["append"] = time.perf_counter() - t0
+                for fase, segundos in tiempos.items():
+                    acumulados[fase] += segundos
+                progreso.seccion(ETAPA_FUSION, hechas, total, ident, path, tiempos=tiempos)
+            comprobar_cancelacion(cancelar)
+            t0 = time.perf_counter()
+            composer.save(self.output_docx)
+            acumulados["save"] = time.perf_counter() - t0
+        except BaseException:
+            # el motor streaming deja un fichero temporal a medio escribir
+            if hasattr(composer, "descartar"):
+                composer.descartar()
+            raise
+        cache_final = cache.estadisticas()
+        progreso.fin_etapa(
+            ETAPA_FUSION, os.path.getsize(self.output_docx), acumulados,
+            f"✅ Documento final guardado en: {self.output_docx}",
+            contadores={
+                f"cache_{nombre}": cache_final[nombre] - cache_inicial[nombre]
+                for nombre in ("aciertos", "fallos", "descartes")
+            },
+        )
+
+    def _pasar_a_composer(self, hechas, prefetch, n_workers, cache, cancelar):
+        """
+        Composer sobre original_docx con las secciones hechas ya añadidas, para seguir la fusión
+        cuando el ensamblador no admite una sección. Las secciones se vuelven a cargar (el
+        ensamblador vació las que añadió) y no se notifican: su avance ya se envió.
+        """
+        composer = Composer(cache.get(self.original_docx, self._abrir(self.original_docx)))
+        for _, _, subdoc, _ in self.iter_loaded_sections(hechas, prefetch, n_workers, cache):
+            comprobar_cancelacion(cancelar)
+            composer.append(subdoc)
+        return composer
 
 # Ejemplo de uso:
 # factory = Test3Factory(
@@ -114,4 +408,4 @@ class Test3Factory:
 #     id_list=[...],
 #     output_docx="new_doc.docx"
 # )
-# factory.merge_sections_with_composer()
+# factory.merge_sections()
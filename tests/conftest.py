@@ -0,0 +1,6 @@
+import os
+import sys
+
+# los módulos del proyecto están en la raíz del repositorio, como en benchmarks/run_benchmarks.py
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
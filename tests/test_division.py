@@ -0,0 +1,59 @@
+# La división por Heading 3 en paralelo debe escribir las mismas secciones, byte a byte,
+# que la división secuencial, y la incremental solo debe reescribir las secciones que cambian.
+import os
+
+import pytest
+from docx import Document
+
+from benchmarks.sinteticos import generar_maestro
+from progress import AvanceSeccion, Progreso
+from test2 import split_doc_by_heading3
+
+
+@pytest.fixture(scope="module")
+def maestro(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("maestro") / "maestro.docx")
+    codigos = generar_maestro(path, n_h1=1, n_h2=2, n_h3=3, parrafos=1, tablas=1, imagen_cada=2, listas=2)
+    return path, codigos
+
+
+def leer_secciones(sections_dir):
+    secciones = {}
+    for nombre in sorted(os.listdir(sections_dir)):
+        with open(os.path.join(sections_dir, nombre), "rb") as f:
+            secciones[nombre] = f.read()
+    return secciones
+
+
+def test_paralelo_igual_que_secuencial(maestro, tmp_path):
+    path, codigos = maestro
+    secuencial = split_doc_by_heading3(path, str(tmp_path / "secuencial"), n_workers=1, progreso=Progreso())
+    paralelo = split_doc_by_heading3(
+        path, str(tmp_path / "paralelo"), n_workers=2, n_chunks=3, progreso=Progreso()
+    )
+    esperadas = leer_secciones(secuencial)
+    assert sorted(esperadas) == sorted(f"{codigo}.docx" for codigo in codigos)
+    assert leer_secciones(paralelo) == esperadas
+
+
+def test_incremental_solo_reescribe_la_seccion_cambiada(maestro, tmp_path):
+    path, codigos = maestro
+    salida = str(tmp_path / "division")
+    sections_dir = split_doc_by_heading3(path, salida, progreso=Progreso())
+    antes = leer_secciones(sections_dir)
+
+    # cambiar el texto de una sección del maestro
+    cambiada = codigos[2]
+    doc = Document(path)
+    parrafos = doc.paragraphs
+    titulo = next(i for i, p in enumerate(parrafos) if p.text.startswith(cambiada))
+    parrafos[titulo + 1].text = "Texto modificado."
+    modificado = str(tmp_path / "maestro.docx")
+    doc.save(modificado)
+
+    eventos = []
+    split_doc_by_heading3(modificado, salida, incremental=True, progreso=Progreso(eventos.append))
+    assert [e.codigo for e in eventos if isinstance(e, AvanceSeccion)] == [cambiada]
+    despues = leer_secciones(sections_dir)
+    assert sorted(despues) == sorted(antes)
+    assert [nombre for nombre in antes if despues[nombre] != antes[nombre]] == [f"{cambiada}.docx"]
@@ -0,0 +1,53 @@
+# La caché de secciones cargadas solo guarda un documento cuando se pide por segunda vez
+# y nunca entrega el documento guardado: lo que se modifica después no debe llegar a la siguiente get.
+import pytest
+from docx import Document
+
+import test3
+from document_cache import DocumentCache, tamaño_estimado
+
+TITULO = "AAA000 Unidad de obra"
+
+
+@pytest.fixture
+def seccion(tmp_path):
+    path = str(tmp_path / "AAA000.docx")
+    doc = Document()
+    doc.add_heading(TITULO, 3)
+    doc.add_paragraph("Texto de la sección.")
+    doc.save(path)
+    return path
+
+
+def titulo(doc):
+    return next(p.text for p in doc.paragraphs if p.style.name == "Heading 3")
+
+
+def test_solo_guarda_al_segundo_uso(seccion):
+    cache = DocumentCache(max_items=4)
+    cache.get(seccion)
+    assert cache.estadisticas()["entradas"] == 0
+    cache.get(seccion)
+    assert cache.estadisticas()["entradas"] == 1
+    cache.get(seccion)
+    estadisticas = cache.estadisticas()
+    assert (estadisticas["aciertos"], estadisticas["fallos"]) == (1, 2)
+    assert estadisticas["bytes"] == tamaño_estimado(seccion)
+
+
+def test_modificar_un_documento_no_cambia_la_cache(seccion):
+    cache = DocumentCache(max_items=4)
+    factory = test3.Test3Factory(None, None, [], None, document_cache=cache)
+    for indice in range(1, 4):
+        doc = cache.get(seccion)
+        assert titulo(doc) == TITULO
+        factory.update_heading3_title(doc, "AAA000a", indice)
+        assert titulo(doc).startswith(f"III.{indice:02d} AAA000a")
+    assert titulo(cache.get(seccion)) == TITULO
+
+
+def test_limite_de_memoria(seccion):
+    cache = DocumentCache(max_items=4, max_bytes=tamaño_estimado(seccion) - 1)
+    for _ in range(3):
+        cache.get(seccion)
+    assert cache.estadisticas()["entradas"] == 0
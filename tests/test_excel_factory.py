@@ -0,0 +1,44 @@
+# La lista de códigos es la misma leída con pandas o en streaming con openpyxl, y el modo
+# automático pasa a streaming a partir de config.EXCEL_STREAMING_MIN_BYTES.
+import pytest
+from openpyxl import Workbook
+
+import excel_factory
+from excel_factory import ExcelFactory
+
+
+@pytest.fixture
+def excel(tmp_path):
+    path = str(tmp_path / "partidas.xlsx")
+    wb = Workbook()
+    ws = wb.active
+    ws.append(["Presupuesto"])
+    ws.append([])
+    ws.append(["CÓDIGO", "UD", "RESUMEN", "PRECIO"])
+    for codigo in ("CCC002", "AAA000", None, "BBB001", "AAA000"):
+        ws.append([codigo, "m", f"Partida {codigo}", 1.5])
+    wb.save(path)
+    return path
+
+
+def test_streaming_igual_que_pandas(excel):
+    factory = ExcelFactory(excel)
+    esperado = ["AAA000", "AAA000", "BBB001", "CCC002"]
+    assert factory.excel_to_list(streaming=False) == esperado
+    assert factory.excel_to_list(streaming=True) == esperado
+
+
+def test_streaming_automatico_por_tamaño(excel, monkeypatch):
+    leidas = []
+    iter_partidas = ExcelFactory.iter_partidas
+
+    def espiar(self, *args):
+        leidas.append(self.excel_path)
+        return iter_partidas(self, *args)
+
+    monkeypatch.setattr(ExcelFactory, "iter_partidas", espiar)
+    ExcelFactory(excel).excel_to_list()
+    assert leidas == []
+    monkeypatch.setattr(excel_factory, "EXCEL_STREAMING_MIN_BYTES", 1)
+    ExcelFactory(excel).excel_to_list()
+    assert leidas == [excel]
@@ -0,0 +1,208 @@
+# Los tres motores de fusión (directo, streaming y Composer) deben generar el mismo anexo a partir
+# de las mismas secciones. Composer numera las listas copiadas con nsid aleatorios y numIds propios,
+# así que con él se compara una forma canónica del documento (ver cuerpo_canonico).
+import hashlib
+import shutil
+import weakref
+import zipfile
+from copy import deepcopy
+
+import pytest
+from docx import Document
+from docx.opc.constants import CONTENT_TYPE as CT
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.opc.packuri import PackURI
+from docx.opc.part import Part
+from docx.oxml.ns import nsmap, qn
+from lxml import etree
+
+from benchmarks.sinteticos import generar_base, generar_maestro
+from document_cache import DocumentCache
+from ensamblador import EnsambladorStreaming
+from progress import ETAPA_FUSION, NIVEL_AVISO, AvanceSeccion, InicioEtapa, Mensaje, Progreso
+from test2 import split_doc_by_heading3
+import test3
+from test3 import MOTOR_COMPOSER, MOTOR_DIRECTO, MOTOR_STREAMING, MOTORES
+
+R_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+PARTES_COMPARADAS = ("word/document.xml", "word/numbering.xml")
+
+
+@pytest.fixture(scope="module")
+def secciones(tmp_path_factory):
+    """
+    Divide un maestro sintético con listas numeradas, viñetas, imágenes y control de cambios.
+    Devuelve (original, carpeta de secciones, identificadores); las dos primeras secciones se
+    repiten al final para que haya listas que reiniciar e imágenes que deduplicar.
+    """
+    trabajo = tmp_path_factory.mktemp("secciones")
+    maestro = str(trabajo / "maestro.docx")
+    base = str(trabajo / "original.docx")
+    codigos = generar_maestro(
+        maestro, n_h1=1, n_h2=2, n_h3=4, parrafos=1, tablas=1, imagen_cada=3, listas=3, cambios_cada=2
+    )
+    generar_base(base)
+    sections_dir = split_doc_by_heading3(maestro, str(trabajo / "division"), n_workers=1, progreso=Progreso())
+    return base, sections_dir, codigos + codigos[:2]
+
+
+@pytest.fixture(scope="module")
+def anexos(secciones, tmp_path_factory):
+    """
+    Fusiona las secciones con cada motor. Devuelve motor -> ruta del anexo.
+    """
+    base, sections_dir, ids = secciones
+    trabajo = tmp_path_factory.mktemp("motores")
+    salidas = {}
+    for motor in MOTORES:
+        salida = str(trabajo / f"anexo_{motor}.docx")
+        factory = test3.Test3Factory(base, sections_dir, ids, salida, document_cache=DocumentCache(0))
+        factory.merge_sections(motor, progreso=Progreso())
+        salidas[motor] = salida
+    return salidas
+
+
+def leer_partes(path):
+    with zipfile.ZipFile(path) as zf:
+        return {nombre: zf.read(nombre) for nombre in zf.namelist()}
+
+
+def listas_canonicas(doc):
+    """
+    numId -> hash de la definición de su lista (abstractNum sin atributos ni nsid) y sus lvlOverride.
+    """
+    numbering = doc.part.numbering_part.element
+    abstractos = {a.get(qn("w:abstractNumId")): a for a in numbering.iterchildren(qn("w:abstractNum"))}
+    listas = {}
+    for num in numbering.iterchildren(qn("w:num")):
+        abstracto = deepcopy(abstractos[num.find(qn("w:abstractNumId")).get(qn("w:val"))])
+        abstracto.attrib.clear()
+        for nsid in abstracto.iter(qn("w:nsid")):
+            nsid.getparent().remove(nsid)
+        datos = etree.tostring(abstracto) + b"".join(
+            etree.tostring(override) for override in num.iterchildren(qn("w:lvlOverride"))
+        )
+        listas[num.get(qn("w:numId"))] = hashlib.sha1(datos).hexdigest()[:12]
+    return listas
+
+
+def cuerpo_canonico(path):
+    """
+    body del anexo con cada r:id sustituido por su destino (hash del contenido en las partes
+    internas) y cada numId por su lista canónica (ver listas_canonicas) y el orden en que
+    aparece la instancia.
+    """
+    doc = Document(path)
+    rels = doc.part.rels
+    listas = listas_canonicas(doc)
+    body = deepcopy(doc.element.body)
+    instancias = {}
+    for el in body.iter():
+        for atributo, valor in el.attrib.items():
+            if atributo.startswith(R_NS):
+                rel = rels[valor]
+                destino = rel.target_ref if rel.is_external else hashlib.sha1(rel.target_part.blob).hexdigest()
+                el.set(atributo, destino)
+        if el.tag == qn("w:numId"):
+            num_id = el.get(qn("w:val"))
+            instancias.setdefault(num_id, len(instancias))
+            el.set(qn("w:val"), f"{listas[num_id]}#{instancias[num_id]}")
+    return etree.tostring(body)
+
+
+def test_fixture_tiene_listas_y_cambios(anexos):
+    documento = leer_partes(anexos[MOTOR_DIRECTO])["word/document.xml"]
+    assert b"<w:pStyle w:val=\"ListNumber\"/>" in documento
+    assert b"<w:pStyle w:val=\"ListBullet\"/>" in documento
+    assert b"<w:ins " in documento and b"<w:del " in documento
+    assert b"<w:numId " in documento
+
+
+def test_streaming_igual_que_directo(anexos):
+    directo = leer_partes(anexos[MOTOR_DIRECTO])
+    streaming = leer_partes(anexos[MOTOR_STREAMING])
+    assert sorted(directo) == sorted(streaming)
+    for nombre in PARTES_COMPARADAS:
+        assert directo[nombre] == streaming[nombre], nombre
+
+
+def test_directo_igual_que_composer(anexos):
+    assert cuerpo_canonico(anexos[MOTOR_DIRECTO]) == cuerpo_canonico(anexos[MOTOR_COMPOSER])
+    numeracion = {
+        motor: sorted(listas_canonicas(Document(anexos[motor])).values())
+        for motor in (MOTOR_DIRECTO, MOTOR_COMPOSER)
+    }
+    assert numeracion[MOTOR_DIRECTO] == numeracion[MOTOR_COMPOSER]
+
+
+def test_streaming_acota_las_secciones_en_memoria(secciones, tmp_path, monkeypatch):
+    base, sections_dir, ids = secciones
+    cargadas = []
+    maximo = 0
+    cargar = test3.Test3Factory.load_section
+    añadir = EnsambladorStreaming.append
+
+    def load_section(self, *args):
+        doc, tiempos = cargar(self, *args)
+        cargadas.append(weakref.ref(doc))
+        return doc, tiempos
+
+    def append(self, doc):
+        nonlocal maximo
+        maximo = max(maximo, sum(1 for ref in cargadas if ref() is not None))
+        añadir(self, doc)
+
+    monkeypatch.setattr(test3.Test3Factory, "load_section", load_section)
+    monkeypatch.setattr(EnsambladorStreaming, "append", append)
+    cache = DocumentCache(16)
+    factory = test3.Test3Factory(base, sections_dir, ids, str(tmp_path / "anexo.docx"), document_cache=cache)
+    factory.merge_sections(MOTOR_STREAMING, prefetch=8, n_workers=4, progreso=Progreso())
+
+    # la sección que se está añadiendo y las cargadas por adelantado, aunque se pida más prefetch
+    assert 0 < maximo <= 1 + test3.PREFETCH_STREAMING
+    assert cache.estadisticas()["fallos"] == 0
+
+
+def test_crea_la_carpeta_de_salida(secciones, tmp_path):
+    base, sections_dir, ids = secciones
+    salida = tmp_path / "out" / "anexo.docx"
+    factory = test3.Test3Factory(base, sections_dir, ids[:2], str(salida), document_cache=DocumentCache(0))
+    factory.merge_sections(MOTOR_DIRECTO, progreso=Progreso())
+    assert salida.is_file()
+    assert (tmp_path / "out" / f"anexo{test3.SUFIJO_NO_AÑADIDOS}").is_file()
+
+
+def test_vuelve_a_composer_si_no_admite_una_seccion(secciones, tmp_path):
+    base, sections_dir, ids = secciones
+    division = tmp_path / "division"
+    shutil.copytree(sections_dir, division)
+    # una nota al pie a mitad de la lista: las secciones anteriores ya se han añadido
+    factory = test3.Test3Factory(base, str(division), ids, None, document_cache=DocumentCache(0))
+    resueltas, _ = factory.resolve_sections()
+    path = resueltas[len(resueltas) // 2][1]
+    doc = Document(path)
+    w = nsmap["w"]
+    notas = etree.fromstring(
+        f'<w:footnotes xmlns:w="{w}"><w:footnote w:id="1"><w:p><w:r><w:t>Nota</w:t></w:r></w:p></w:footnote></w:footnotes>'
+    )
+    parte = Part(PackURI("/word/footnotes.xml"), CT.WML_FOOTNOTES, etree.tostring(notas), doc.part.package)
+    doc.part.relate_to(parte, RT.FOOTNOTES)
+    doc.paragraphs[-1]._p.append(etree.fromstring(f'<w:r xmlns:w="{w}"><w:footnoteReference w:id="1"/></w:r>'))
+    doc.save(path)
+
+    salidas = {}
+    for motor in (MOTOR_DIRECTO, MOTOR_STREAMING, MOTOR_COMPOSER):
+        eventos = []
+        salidas[motor] = str(tmp_path / f"anexo_{motor}.docx")
+        factory = test3.Test3Factory(base, str(division), ids, salidas[motor], document_cache=DocumentCache(0))
+        factory.merge_sections(motor, progreso=Progreso(eventos.append))
+        fusion = [e for e in eventos if e.etapa == ETAPA_FUSION]
+        assert sum(isinstance(e, InicioEtapa) for e in fusion) == 1
+        assert [e.hecho for e in fusion if isinstance(e, AvanceSeccion)] == list(range(1, len(ids) + 1))
+        avisos = [e for e in fusion if isinstance(e, Mensaje) and e.nivel == NIVEL_AVISO]
+        assert len(avisos) == (0 if motor == MOTOR_COMPOSER else 1)
+
+    composer = cuerpo_canonico(salidas[MOTOR_COMPOSER])
+    assert b"w:footnoteReference" in composer
+    assert cuerpo_canonico(salidas[MOTOR_DIRECTO]) == composer
+    assert cuerpo_canonico(salidas[MOTOR_STREAMING]) == composer
@@ -0,0 +1,53 @@
+# La caché de anexos devuelve el anexo guardado para la misma clave, cambia de clave si cambia
+# una sección y, por encima de max_bytes, elimina primero las entradas usadas hace más tiempo.
+import os
+
+from progress import Mensaje, Progreso
+from result_cache import ResultCache
+
+
+def escribir(path, contenido):
+    with open(path, "wb") as f:
+        f.write(contenido)
+    return str(path)
+
+
+def test_acierto_y_fallo_al_cambiar_una_seccion(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"))
+    original = escribir(tmp_path / "original.docx", b"original")
+    seccion = escribir(tmp_path / "AAA000.docx", b"seccion")
+    anexo = escribir(tmp_path / "anexo.docx", b"anexo")
+    clave = cache.make_key(["AAA000"], [seccion], original, "directo")
+    salida = str(tmp_path / "salida.docx")
+    assert not cache.get(clave, salida)
+
+    cache.put(clave, anexo, Progreso())
+    assert cache.make_key(["AAA000"], [seccion], original, "directo") == clave
+    assert cache.get(clave, salida)
+    with open(salida, "rb") as f:
+        assert f.read() == b"anexo"
+
+    escribir(seccion, b"seccion modificada")
+    nueva = cache.make_key(["AAA000"], [seccion], original, "directo")
+    assert nueva != clave
+    assert not cache.get(nueva, salida)
+    assert cache.make_key(["AAA000"], [seccion], original, "streaming") != nueva
+
+
+def test_elimina_la_entrada_menos_usada(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"), max_bytes=250)
+    anexo = escribir(tmp_path / "anexo.docx", b"x" * 100)
+    eventos = []
+    progreso = Progreso(eventos.append)
+    cache.put("a", anexo, progreso)
+    cache.put("b", anexo, progreso)
+    # fechas de uso explícitas: a es la más antigua hasta que se vuelve a pedir
+    os.utime(cache._entry_path("a"), (1000, 1000))
+    os.utime(cache._entry_path("b"), (2000, 2000))
+    assert cache.get("a", str(tmp_path / "salida.docx"))
+
+    cache.put("c", anexo, progreso)
+    assert sorted(os.listdir(cache.cache_dir)) == ["a.docx", "c.docx"]
+    assert [e.texto for e in eventos if isinstance(e, Mensaje)] == [
+        f"Eliminado de la caché de anexos: {cache._entry_path('b')}"
+    ]
@@ -0,0 +1,58 @@
+# docx_tiene_bloques responde si el body tiene párrafos o tablas leyendo document.xml en streaming;
+# un body vacío o con solo el sectPr (o controles de contenido) cuenta como vacío.
+import pytest
+from docx import Document
+from docx.oxml.ns import qn
+from lxml import etree
+
+from word_factory import docx_tiene_bloques
+
+
+def guardar(tmp_path, nombre, preparar):
+    doc = Document()
+    body = doc.element.body
+    for hijo in list(body):
+        body.remove(hijo)
+    preparar(doc, body)
+    path = str(tmp_path / nombre)
+    doc.save(path)
+    return path
+
+
+def con_sectpr(doc, body):
+    body.append(etree.SubElement(etree.Element("x"), qn("w:sectPr")))
+
+
+def con_sdt(doc, body):
+    sdt = etree.SubElement(body, qn("w:sdt"))
+    contenido = etree.SubElement(sdt, qn("w:sdtContent"))
+    # el párrafo dentro del control no es hijo directo del body
+    etree.SubElement(contenido, qn("w:p"))
+    con_sectpr(doc, body)
+
+
+def con_parrafo(doc, body):
+    con_sectpr(doc, body)
+    doc.add_paragraph("Texto")
+
+
+def con_tabla(doc, body):
+    con_sectpr(doc, body)
+    doc.add_table(rows=1, cols=1)
+
+
+@pytest.mark.parametrize(
+    "preparar, esperado",
+    [
+        (lambda doc, body: None, False),
+        (con_sectpr, False),
+        (con_sdt, False),
+        (con_parrafo, True),
+        (con_tabla, True),
+    ],
+    ids=["body_vacio", "solo_sectpr", "solo_sdt", "parrafo", "tabla"],
+)
+def test_docx_tiene_bloques(tmp_path, preparar, esperado):
+    path = guardar(tmp_path, "doc.docx", preparar)
+    assert docx_tiene_bloques(path) is esperado
+    assert any(True for _ in Document(path).element.body.iterchildren(qn("w:p"), qn("w:tbl"))) is esperado
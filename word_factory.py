@@ -5,11 +5,59 @@ from docx.table import Table
 from docx.text.paragraph import Paragraph
 from docx.oxml import OxmlElement
 import os, json
+import posixpath
+import zipfile
+from lxml import etree
 from docx.shared import Pt
 from docx.oxml.ns import qn
 
 from config import WORD_OUTPUT_PATH
 
+# Hijos del body que cuentan como bloques (los mismos que recorre iter_block_items)
+TAGS_BLOQUE = (qn("w:p"), qn("w:tbl"))
+TAG_BODY = qn("w:body")
+RT_DOCUMENTO = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"
+
+
+def docx_tiene_bloques(ruta):
+    """
+    Indica si el body del .docx tiene al menos un párrafo o tabla, sin cargarlo con python-docx:
+    lee word/document.xml del zip con iterparse y se detiene en el primer hijo del body que sea
+    un bloque, de modo que el coste no depende del tamaño del documento.
+    """
+    with zipfile.ZipFile(ruta) as zf:
+        # parte principal según _rels/.rels (normalmente word/document.xml)
+        nombre = "word/document.xml"
+        try:
+            rels = etree.fromstring(zf.read("_rels/.rels"))
+        except KeyError:
+            rels = None
+        if rels is not None:
+            for rel in rels:
+                if rel.get("Type") == RT_DOCUMENTO:
+                    nombre = posixpath.normpath(rel.get("Target").lstrip("/"))
+                    break
+
+        with zf.open(nombre) as f:
+            profundidad = 0
+            nivel_body = None
+            for evento, el in etree.iterparse(f, events=("start", "end")):
+                if evento == "start":
+                    profundidad += 1
+                    if el.tag == TAG_BODY:
+                        nivel_body = profundidad
+                    elif nivel_body is not None and profundidad == nivel_body + 1 and el.tag in TAGS_BLOQUE:
+                        return True
+                    continue
+                if el.tag == TAG_BODY:
+                    return False
+                # liberar cada hijo del body al terminarlo (sectPr, controles de contenido...);
+                # profundidad es aún la del elemento que termina
+                if nivel_body is not None and profundidad == nivel_body + 1:
+                    el.clear()
+                profundidad -= 1
+    return False
+
 class WordFactory:
     def __init__(self, json_path, word_path):
         with open(json_path, 'r', encoding='utf-8') as f:
@@ -31,7 +79,7 @@ class WordFactory:
             elif child.tag.endswith('tbl'):
                 yield Table(child, parent)
 
-    def extraer_secciones(self, doc):
+    def extraer_secciones(self, doc, headings=None):
         """
         Recorre el documento y agrupa de forma jerárquica en un diccionario utilizando tres niveles:
         - Nivel 1: párrafos con estilo "Heading 1"
@@ -49,6 +97,9 @@ class WordFactory:
             },
             ...
         }
+
+        Si se pasa el diccionario headings, se rellena con los párrafos de cada heading 1 y 2,
+        con claves (h1,) y (h1, h2), para poder eliminarlos después sin volver a recorrer el documento.
         """
         secciones = {}
         current_h1 = None
@@ -66,12 +117,16 @@ class WordFactory:
                     secciones[current_h1] = {}
                     current_h2 = None
                     current_h3 = None
+                    if headings is not None:
+                        headings.setdefault((current_h1,), []).append(bloque)
                 elif "heading 2" in estilo:
                     if current_h1 is None:
                         continue
                     current_h2 = texto
                     secciones[current_h1][current_h2] = {}
                     current_h3 = None
+                    if headings is not None:
+                        headings.setdefault((current_h1, current_h2), []).append(bloque)
                 elif "heading 3" in estilo:
                     if current_h1 is None or current_h2 is None:
                         continue
@@ -93,15 +148,13 @@ class WordFactory:
         """
         block._element.getparent().remove(block._element)
 
-    def remove_heading(self, doc, heading_text, heading_level):
+    def remove_headings(self, paragraphs):
         """
-        Elimina del documento el párrafo con el heading especificado (texto y nivel)
+        Elimina los párrafos de heading ya localizados (por ejemplo, los que recoge extraer_secciones).
         """
-        for bloque in list(self.iter_block_items(doc)):
-            if (isinstance(bloque, Paragraph) and 
-                bloque.text.strip() == heading_text and 
-                f"heading {heading_level}" in str(bloque.style).lower()):
-                self.remove_block(bloque)
+        for p in paragraphs:
+            if p._element.getparent() is not None:
+                self.remove_block(p)
 
     def insert_paragraph_after(self, block, text, style=None):
         """
@@ -133,6 +186,49 @@ class WordFactory:
 
         return new_paragraph
     
+    def paragraph_template(self, doc, style=None):
+        """
+        Crea (sin insertarlo) un párrafo con un único run ya formateado como los de insert_paragraph_after,
+        para clonarlo con paragraph_from_template en lugar de formatear cada párrafo por separado.
+        """
+        new_p = OxmlElement("w:p")
+        new_r = OxmlElement("w:r")
+        new_t = OxmlElement("w:t")
+        new_r.append(new_t)
+        new_p.append(new_r)
+
+        new_paragraph = Paragraph(new_p, doc._body)
+        if style is not None:
+            new_paragraph.style = style
+        run = new_paragraph.runs[0]
+        run.font.name = "Adif Fago No Regular"
+        run.font.size = Pt(11)
+        run._element.rPr.rFonts.set(qn('w:eastAsia'), "Adif Fago No Regular")
+        return new_p
+
+    def paragraph_from_template(self, template, text):
+        """
+        Devuelve una copia del párrafo plantilla con el texto indicado.
+        """
+        new_p = deepcopy(template)
+        new_p.find(qn("w:r")).find(qn("w:t")).text = text
+        return new_p
+
+    def rebuild_body(self, body, eliminar, inserciones):
+        """
+        Reconstruye en una sola pasada la lista de hijos del body: omite los elementos de eliminar
+        y coloca tras cada elemento de inserciones los párrafos nuevos asociados.
+        """
+        hijos = []
+        for el in body.iterchildren():
+            if el in eliminar:
+                continue
+            hijos.append(el)
+            nuevos = inserciones.get(el)
+            if nuevos:
+                hijos.extend(nuevos)
+        body[:] = hijos
+
     def count_elements(self,data):
         """
         Cuenta el número total de elementos en todas las listas que se encuentran
@@ -159,7 +255,7 @@ class WordFactory:
         recurse(data)
         return total
 
-    def filter_sections(self, codigos_adicionales, ruta_entrada, ruta_salida = None):
+    def filter_sections(self, codigos_adicionales, ruta_entrada, ruta_salida = None, batch=True):
         """
         Recorre la estructura jerárquica extraída con extraer_secciones y:
         - Elimina aquellas secciones (nivel 3) cuyo código (primeros 6 caracteres del heading) no estén en los códigos permitidos.
@@ -168,58 +264,108 @@ class WordFactory:
         - Para las secciones permitidas, se inserta al final:
           primero un párrafo con el título "UNIDADES" (con estilo "Heading 3")
           y luego otro párrafo con la información adicional.
+
+        Con batch=True (por defecto) las eliminaciones e inserciones se anotan durante el recorrido
+        y el body se reconstruye una sola vez al final con rebuild_body; con batch=False el árbol
+        se modifica elemento a elemento.
+
+        Devuelve un diccionario con el resumen del filtrado, para no tener que volver a abrir
+        el documento guardado:
+        - secciones: estructura jerárquica resultante (la de extraer_secciones, ya filtrada)
+        - secciones_conservadas / secciones_eliminadas: número de Heading 3 de cada tipo
+        - bloques: párrafos y tablas que quedan en el body
+        - vacio: True si no queda ningún bloque
+        - ruta_salida: ruta donde se guardó el documento (o None)
         """
-        # Calculamos los códigos permitidos a partir del valor de "CÓDIGO" en cada diccionario
-        codigos_permitidos = {d["CÓDIGO"][:6] for d in codigos_adicionales}
-        
+        # Índice código (primeros 6 caracteres) -> partidas, en el orden del JSON
+        partidas_por_codigo = {}
+        for d in codigos_adicionales:
+            partidas_por_codigo.setdefault(d["CÓDIGO"][:6], []).append(d)
+
         # Abrir el documento de entrada
         doc = Document(ruta_entrada)
-        secciones = self.extraer_secciones(doc)
+        headings = {}
+        secciones = self.extraer_secciones(doc, headings)
+
+        # Modo batch: elementos a eliminar, párrafos a insertar tras cada elemento y plantillas ya formateadas
+        eliminar = set()
+        inserciones = {}
+        if batch:
+            plantilla_unidades = self.paragraph_template(doc, style="Heading 4")
+            plantilla_partidas = self.paragraph_template(doc)
 
         total_number_of_sections = self.count_elements(secciones)
         print(f"Numero total de partidas de codigos a analizar: {total_number_of_sections}")
+        analizadas = 0
+        conservadas = 0
+        eliminadas = 0
 
-        
         # Recorrer la estructura jerárquica
         for h1 in list(secciones.keys()):
             for h2 in list(secciones[h1].keys()):
                 for h3 in list(secciones[h1][h2].keys()):
-                    codigo = h3[:6]
-                    current_number_of_sections = self.count_elements(secciones)
-                    print(f"Numero restante de partidas a analizar {total_number_of_sections - current_number_of_sections}/{total_number_of_sections}:")
-    
-                    if codigo not in codigos_permitidos:
+                    bloques = secciones[h1][h2][h3]
+                    print(f"Numero restante de partidas a analizar {analizadas}/{total_number_of_sections}:")
+                    analizadas += len(bloques)
+
+                    datos = partidas_por_codigo.get(h3[:6])
+                    if datos is None:
+                        eliminadas += 1
                         # Eliminar todos los bloques asociados a este heading 3
-                        for bloque in secciones[h1][h2][h3]:
-                            self.remove_block(bloque)
+                        if batch:
+                            eliminar.update(bloque._element for bloque in bloques)
+                        else:
+                            for bloque in bloques:
+                                self.remove_block(bloque)
                         del secciones[h1][h2][h3]
                     else:
-                        # Sección permitida: insertar la información adicional
-                        datos = [d for d in codigos_adicionales if d["CÓDIGO"][:6] == codigo]
-                        datos_ordenados = sorted(codigos_adicionales, key=lambda d: d["CÓDIGO"])
-                        if datos_ordenados:
-                            ultimo_bloque = secciones[h1][h2][h3][-1]
-                            p_unidades = self.insert_paragraph_after(ultimo_bloque, "UNIDADES", style="Heading 4")
-
+                        conservadas += 1
                         texto_partidas = ""
                         for unidades in datos:
                             texto_partidas += f"CÓDIGO: {unidades['CÓDIGO']} | UD: {unidades['UD']} | RESUMEN: {unidades['RESUMEN']}\n"
-                            # Insertar el párrafo con la información adicional justo después de "UNIDADES"
-                        self.insert_paragraph_after(p_unidades, texto_partidas)
+
+                        # Sección permitida: insertar "UNIDADES" tras su último bloque
+                        # y justo después el párrafo con la información adicional
+                        if batch:
+                            inserciones[bloques[-1]._element] = [
+                                self.paragraph_from_template(plantilla_unidades, "UNIDADES"),
+                                self.paragraph_from_template(plantilla_partidas, texto_partidas),
+                            ]
+                        else:
+                            p_unidades = self.insert_paragraph_after(bloques[-1], "UNIDADES", style="Heading 4")
+                            self.insert_paragraph_after(p_unidades, texto_partidas)
                 # Si el nivel 2 quedó sin secciones (heading 3) válidas, eliminar el heading 2 del documento
                 if not secciones[h1][h2]:
-                    self.remove_heading(doc, h2, 2)
+                    if batch:
+                        eliminar.update(p._element for p in headings.pop((h1, h2), []))
+                    else:
+                        self.remove_headings(headings.pop((h1, h2), []))
                     del secciones[h1][h2]
             # Si el nivel 1 quedó sin secciones (heading 2), eliminar el heading 1 del documento
             if not secciones[h1]:
-                self.remove_heading(doc, h1, 1)
+                if batch:
+                    eliminar.update(p._element for p in headings.pop((h1,), []))
+                else:
+                    self.remove_headings(headings.pop((h1,), []))
                 del secciones[h1]
-                
+
+        if batch:
+            self.rebuild_body(doc.element.body, eliminar, inserciones)
+
+        bloques = sum(1 for el in doc.element.body.iterchildren() if el.tag in TAGS_BLOQUE)
+
         # Guardar el documento modificado
         if ruta_salida:
             doc.save(ruta_salida)
         print(f"Documento procesado y guardado en {ruta_salida}")
-        return secciones
+        return {
+            "secciones": secciones,
+            "secciones_conservadas": conservadas,
+            "secciones_eliminadas": eliminadas,
+            "bloques": bloques,
+            "vacio": bloques == 0,
+            "ruta_salida": ruta_salida,
+        }
 
     def concatenar_docs(self, doc_base, lista_rutas, ruta_salida):
         """
@@ -247,19 +393,27 @@ class WordFactory:
             return None
             
         
+        # el maestro sin párrafos ni tablas no se carga: no puede quedar nada tras el filtrado
+        if not docx_tiene_bloques(self.word_path):
+            print(f"El archivo Word está vacío: {self.word_path}")
+            return None
+
         print(f"Procesando archivo: {self.word_path}")
         
         # Procesar el documento
-        self.filter_sections(
+        resumen = self.filter_sections(
             codigos_adicionales=self.codigos_adicionales, 
             ruta_entrada=self.word_path, 
             ruta_salida=WORD_OUTPUT_PATH
         )
+        print(
+            f"Secciones conservadas: {resumen['secciones_conservadas']}, "
+            f"eliminadas: {resumen['secciones_eliminadas']}, bloques: {resumen['bloques']}"
+        )
         
-        # Verificar si el documento procesado tiene contenido
-        doc_temp = Document(WORD_OUTPUT_PATH)
-        # Si hay al menos un bloque (párrafo o tabla), se considera que tiene contenido
-        if any(True for _ in self.iter_block_items(doc_temp)):
+        # Si hay al menos un bloque (párrafo o tabla), se considera que tiene contenido;
+        # filter_sections ya lo sabe, no hace falta volver a abrir el documento guardado
+        if not resumen["vacio"]:
             print(f"Archivo procesado correctamente: {WORD_OUTPUT_PATH}")
             return WORD_OUTPUT_PATH
         else: